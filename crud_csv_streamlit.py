@@ -1,18 +1,31 @@
+from collections.abc import Callable
 from datetime import date
 
 import pandas as pd
 import streamlit as st
 
+from utils import cadastro
+
 st.set_page_config("Teste de Funcionamento de CSV", layout="wide")
 
 dict_sex: dict[int, str] = {0: "Feminino", 1: "Masculino"}
 
 
-@st.cache_data(ttl=1)
-def load_data() -> pd.DataFrame:
-	df: pd.DataFrame = pd.read_csv("data/cadastro.csv", engine="pyarrow")
-	df["nascimento"] = pd.to_datetime(df["nascimento"]).dt.date
-	return df
+@st.cache_data(show_spinner=False, max_entries=2)
+def load_data(estado: tuple[str, int]) -> pd.DataFrame:
+	# O estado (mtime/tamanho do CSV e do diário) é só a chave: a leitura só acontece quando os arquivos mudaram.
+	return cadastro.carregar()
+
+
+def save(message: str, change: Callable[..., pd.DataFrame], *args) -> None:
+	try:
+		st.session_state["cadastro"] = change(st.session_state["cadastro"], *args)
+	except KeyError:
+		st.session_state["message"] = "gone"
+	except ValueError:
+		st.session_state["message"] = "stale"
+	else:
+		st.session_state["message"] = message
 
 
 @st.dialog("Novo Cadastro")
@@ -27,15 +40,7 @@ def add() -> None:
 
 	if st.container(horizontal_alignment="center").button("Salvar", type="primary", icon=":material/save:"):
 		if all([name, birth, sex is not None]):
-			incluir: pd.DataFrame = pd.DataFrame({
-				"nome": [name],
-				"nascimento": [pd.to_datetime(birth).date()],
-				"sexo": [sex]
-			})
-			st.session_state["cadastro"] = pd.concat([st.session_state["cadastro"], incluir], ignore_index=True)
-			st.session_state["cadastro"].to_csv("data/cadastro.csv", index=False)
-			st.cache_data.clear()
-			st.session_state["message"] = "add"
+			save("add", cadastro.incluir, name, birth, sex)
 			st.rerun()
 		else:
 			st.warning("**Todos campos devem ser preenchidos!**", icon=":material/warning:")
@@ -55,10 +60,7 @@ def edit() -> None:
 
 	if st.container(horizontal_alignment="center").button("Salvar", type="primary", icon=":material/save:"):
 		if all([name, birth, sex is not None]):
-			st.session_state["cadastro"].iloc[select] = [name, pd.to_datetime(birth).date(), sex]
-			st.session_state["cadastro"].to_csv("data/cadastro.csv", index=False)
-			st.cache_data.clear()
-			st.session_state["message"] = "edit"
+			save("edit", cadastro.alterar, st.session_state["cadastro"].index[select], name, birth, sex)
 			st.rerun()
 		else:
 			st.warning("**Todos campos devem ser preenchidos!**", icon=":material/warning:")
@@ -75,19 +77,18 @@ def delete() -> None:
 	if st.session_state["sim"]:
 		select: int = int(st.session_state["editor"]["selection"]["rows"][0])
 
-		st.session_state["cadastro"].drop(index=select, inplace=True)
-		st.session_state["cadastro"].reset_index(drop=True, inplace=True)
-		st.session_state["cadastro"].to_csv("data/cadastro.csv", index=False)
-		st.cache_data.clear()
-		st.session_state["message"] = "delete"
+		save("delete", cadastro.excluir, st.session_state["cadastro"].index[select])
 		st.rerun()
 
 	if st.session_state["não"]:
 		st.rerun()
 
 
+# Cada sessão tem sua cópia; a cada rerun ela só recebe o que as outras sessões gravaram desde a última vez.
 if "cadastro" not in st.session_state:
-	st.session_state["cadastro"] = load_data()
+	st.session_state["cadastro"] = load_data(cadastro.estado())
+else:
+	st.session_state["cadastro"] = cadastro.atualizar(st.session_state["cadastro"])
 
 st.dataframe(
 	data=st.session_state["cadastro"],
@@ -122,4 +123,11 @@ if "message" in st.session_state:
 	if st.session_state["message"] == "delete":
 		st.toast("**1 linha excluída com sucesso!**", icon=":material/check_circle:")
 
+	if st.session_state["message"] == "gone":
+		st.toast("**O registro já tinha sido excluído em outra sessão!**", icon=":material/warning:")
+
+	if st.session_state["message"] == "stale":
+		st.toast("**O cadastro foi regravado em outra sessão, confira a linha e tente de novo!**",
+		         icon=":material/warning:")
+
 	del st.session_state["message"]
@@ -2,44 +2,48 @@ from datetime import date
 
 import pandas as pd
 import streamlit as st
-from sqlalchemy import text
-from streamlit.connections import SQLConnection
+from sqlalchemy import Engine
+
+from utils import banco, simples
 
 st.set_page_config("Teste de Funcionamento de SQLite", layout="wide", initial_sidebar_state="auto")
 
-engine: SQLConnection = SQLConnection("SQLite3")
+engine: Engine = banco.conexao("SQLite3")
+
+banco.preparar(str(engine.url), "simples", engine, simples.MIGRACOES)
 
 dict_sex: dict[int, str] = {0: "Feminino", 1: "Masculino"}
 
 
-@st.cache_data(ttl=1)
-def load_data() -> pd.DataFrame:
-	df: pd.DataFrame = engine.query("SELECT idx, nome, nascimento, sexo FROM simples")
+@st.cache_data(max_entries=2)
+def load_data(versao: int) -> pd.DataFrame:
+	df: pd.DataFrame = banco.ler(engine, "SELECT idx, nome, nascimento, sexo FROM simples").set_index("idx")
 	df["nascimento"] = pd.to_datetime(df["nascimento"])
 	return df
 
 
+def patch(_idx: int, _row: dict | None, _versao: int, _changes: int) -> None:
+	# Corrige só a linha escrita na cópia da sessão (None: linha excluída). Se a versão andou mais do que as mudanças
+	# desta escrita, outra sessão também escreveu: a versão da sessão fica como está e a tabela é relida no rerun.
+	if st.session_state.get("versao") != _versao - _changes:
+		return
+
+	if _row is None:
+		st.session_state["simples"].drop(index=_idx, inplace=True, errors="ignore")
+	else:
+		st.session_state["simples"].loc[_idx] = [_row["nome"], pd.Timestamp(_row["nascimento"]), _row["sexo"]]
+
+	st.session_state["versao"] = _versao
+
+
 def create_or_update(_name: str, _birth: date, _sex: int, _idx: int | None = None) -> None:
-	with engine.engine.connect() as conx:
-		conx.execute(
-			text("""
-				INSERT INTO simples (idx, nome, nascimento, sexo)
-				VALUES (:idx, :nome, :nascimento, :sexo)
-				ON CONFLICT(idx) DO UPDATE SET
-					nome = excluded.nome,
-					nascimento = excluded.nascimento,
-					sexo = excluded.sexo
-			"""), dict(idx=_idx, nome=_name, nascimento=_birth, sexo=_sex),
-		)
-		conx.commit()
-		st.cache_data.clear()
+	row, versao = simples.gravar(engine, simples.SALVAR, dict(idx=_idx, nome=_name, nascimento=_birth, sexo=_sex))
+	patch(row["idx"], row, versao, 1)
 
 
 def delete_by_idx(_idx: int) -> None:
-	with engine.engine.connect() as conx:
-		conx.execute(text("DELETE FROM simples WHERE idx = :idx"), dict(idx=_idx))
-		conx.commit()
-		st.cache_data.clear()
+	row, versao = simples.gravar(engine, simples.EXCLUIR, dict(idx=_idx))
+	patch(_idx, None, versao, int(row is not None))
 
 
 @st.dialog("Novo Cadastro")
@@ -56,7 +60,6 @@ def add() -> None:
 		if st.button("Salvar", type="primary", icon=":material/save:"):
 			if all([name, birth, sex is not None]):
 				create_or_update(name, birth, sex)
-				st.session_state["simples"] = load_data()
 				st.session_state["message"] = "new"
 				st.rerun()
 			else:
@@ -67,7 +70,7 @@ def add() -> None:
 def edit() -> None:
 	select: int = int(st.session_state["editor"]["selection"]["rows"][0])
 	row: pd.Series = st.session_state["simples"].iloc[select]
-	selected_idx: int = int(row["idx"])
+	selected_idx: int = int(row.name)
 
 	name: str = st.text_input("Nome:", value=row["nome"])
 
@@ -81,7 +84,6 @@ def edit() -> None:
 		if st.button("Salvar", type="primary", icon=":material/save:"):
 			if all([name, birth, sex is not None]):
 				create_or_update(name, birth, sex, selected_idx)
-				st.session_state["simples"] = load_data()
 				st.session_state["message"] = "edit"
 				st.rerun()
 			else:
@@ -98,11 +100,10 @@ def delete() -> None:
 
 	if st.session_state["sim"]:
 		select: int = int(st.session_state["editor"]["selection"]["rows"][0])
-		selected_idx: int = int(st.session_state["simples"].iloc[select]["idx"])
+		selected_idx: int = int(st.session_state["simples"].index[select])
 
 		delete_by_idx(selected_idx)
 
-		st.session_state["simples"] = load_data()
 		st.session_state["message"] = "delete"
 		st.rerun()
 
@@ -110,8 +111,12 @@ def delete() -> None:
 		st.rerun()
 
 
-if "simples" not in st.session_state:
-	st.session_state["simples"] = load_data()
+# A cópia da sessão só é relida quando simples mudou em outra sessão; as escritas desta já a corrigem linha a linha.
+versao: int = banco.versao(engine, "simples")
+
+if st.session_state.get("versao") != versao:
+	st.session_state["simples"] = load_data(versao)
+	st.session_state["versao"] = versao
 
 st.dataframe(
 	data=st.session_state["simples"],
@@ -148,3 +153,5 @@ if "message" in st.session_state:
 		st.toast("**1 linha excluída com sucesso!**", icon=":material/check_circle:")
 
 	del st.session_state["message"]
+
+st.sidebar.caption(banco.esperas(engine))
@@ -2,39 +2,51 @@ from datetime import date
 
 import pandas as pd
 import streamlit as st
-from sqlalchemy import text
-from streamlit.connections import SQLConnection
+from sqlalchemy import Engine, text
+
+from utils import banco, simples
 
 st.set_page_config("Teste de Funcionamento de SQLite", layout="wide", initial_sidebar_state="auto")
 
-engine: SQLConnection = SQLConnection("SQLite3")
+engine: Engine = banco.conexao("SQLite3")
 
+banco.preparar(str(engine.url), "simples", engine, simples.MIGRACOES)
 
-@st.cache_data(ttl=1)
-def load_data() -> pd.DataFrame:
-	df: pd.DataFrame = engine.query("SELECT idx, nome, nascimento, sexo FROM simples")
-	df["nascimento"] = pd.to_datetime(df["nascimento"])
-	return df
+# Linhas por página: a tela tem sempre no máximo este número de linhas (e de botões), qualquer que seja o tamanho
+# da tabela.
+page_size: int = 20
 
 
-@st.dialog("Editar Cadastro")
-def edit(_idx: int) -> None:
-	_row: pd.Series = st.session_state["simples"][st.session_state["simples"]["idx"].eq(_idx)].iloc[0]
+@st.cache_data(show_spinner=False, max_entries=32)
+def load_page(after: int | None, versao: int) -> pd.DataFrame:
+	# Uma linha a mais que a página só para saber se existe a próxima.
+	if after is None:
+		return banco.ler(engine, simples.PRIMEIRA_PAGINA, params=dict(limite=page_size + 1))
+
+	return banco.ler(engine, simples.PROXIMA_PAGINA, params=dict(idx=after, limite=page_size + 1))
+
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def load_total(versao: int) -> int:
+	return int(banco.ler(engine, simples.TOTAL)["total"].iat[0])
 
+
+@st.dialog("Editar Cadastro")
+def edit(_idx: int, _name: str, _birth: str, _sex: int) -> None:
 	dict_sex: dict[int, str] = {0: "Feminino", 1: "Masculino"}
 
-	name: str = st.text_input("Nome:", value=_row["nome"])
+	name: str = st.text_input("Nome:", value=_name)
 
 	with st.container(horizontal=True):
 		birth: date = st.date_input("Data de Nascimento:", format="DD/MM/YYYY",
-									min_value=date(1900, 1, 1), value=_row["nascimento"])
-		sex: int = st.radio("Sexo:", options=list(dict_sex.keys()), index=int(_row["sexo"]),
+									min_value=date(1900, 1, 1), value=date.fromisoformat(_birth[:10]))
+		sex: int = st.radio("Sexo:", options=list(dict_sex.keys()), index=int(_sex),
 							format_func=lambda x: dict_sex.get(x), horizontal=True)
 
 	with st.container(horizontal=True, horizontal_alignment="right"):
 		if st.button("Salvar", type="primary", icon=":material/save:"):
 			if all([name, birth, sex is not None]):
-				with engine.engine.connect() as conx:
+				with engine.begin() as conx:
 					conx.execute(
 						text("""
 							UPDATE simples
@@ -45,9 +57,6 @@ def edit(_idx: int) -> None:
 						"""),
 						dict(name=name, birth=birth, sex=sex, idx=_idx)
 					)
-					conx.commit()
-				st.cache_data.clear()
-				st.session_state["simples"] = load_data()
 				st.session_state["message"] = "edit"
 				st.rerun()
 			else:
@@ -63,11 +72,8 @@ def delete(_idx: int) -> None:
 		st.button("Não", key="não", type="primary", icon=":material/cancel:")
 
 	if st.session_state["sim"]:
-		with engine.engine.connect() as conx:
+		with engine.begin() as conx:
 			conx.execute(text("DELETE FROM simples WHERE idx = :idx"), dict(idx=_idx))
-			conx.commit()
-		st.cache_data.clear()
-		st.session_state["simples"] = load_data()
 		st.session_state["message"] = "delete"
 		st.rerun()
 
@@ -75,18 +81,34 @@ def delete(_idx: int) -> None:
 		st.rerun()
 
 
-if "simples" not in st.session_state:
-	st.session_state["simples"] = load_data()
+# Só a página visível é lida (e guardada no cache até simples mudar, aqui ou em outra sessão). A pilha guarda o último
+# idx de cada página já vista, para voltar sem OFFSET; as chaves dos botões são as posições na página, então a
+# árvore de widgets é a mesma em qualquer página.
+versao: int = banco.versao(engine, "simples")
+keys: list[int] = st.session_state.setdefault("cursores", [])
+listing: pd.DataFrame = load_page(keys[-1] if keys else None, versao)
+
+if listing.empty and keys:
+	# A última página ficou vazia (exclusão): volta para a anterior.
+	keys.pop()
+	st.rerun()
 
-for row in st.session_state["simples"].itertuples(index=False, name=None):
+for i, row in enumerate(listing.head(page_size).itertuples(index=False)):
 	with st.container(horizontal=True):
 		col1, col2, col3 = st.columns(3)
-		col1.write(f"**{row[1]}**")
-		col2.write(f"**{row[2].strftime('%d/%m/%Y')}**")
-		col3.write(f"**{'Feminino' if row[3] == 0 else 'Masculino'}**")
+		col1.write(f"**{row.nome}**")
+		col2.write(f"**{row.data}**")
+		col3.write(f"**{row.rotulo}**")
 
-		st.button("**:material/edit:**", key=f"edit_{row[0]}", type="primary", on_click=edit, args=(row[0],))
-		st.button("**:material/delete:**", key=f"delete_{row[0]}", type="primary", on_click=delete, args=(row[0],))
+		st.button("**:material/edit:**", key=f"edit_{i}", type="primary", on_click=edit,
+		          args=(row.idx, row.nome, row.nascimento, row.sexo))
+		st.button("**:material/delete:**", key=f"delete_{i}", type="primary", on_click=delete, args=(row.idx,))
+
+with st.container(horizontal=True, vertical_alignment="center"):
+	st.button("**Anterior**", icon=":material/chevron_left:", disabled=not keys, on_click=keys.pop)
+	st.button("**Próxima**", icon=":material/chevron_right:", disabled=len(listing) <= page_size,
+	          on_click=lambda: keys.append(int(listing["idx"].iat[page_size - 1])))
+	st.caption(f"Página {len(keys) + 1} de {max(-(-load_total(versao) // page_size), 1)}")
 
 if "message" in st.session_state:
 	if st.session_state["message"] == "edit":
@@ -96,3 +118,5 @@ if "message" in st.session_state:
 		st.toast("**1 linha excluída com sucesso!**", icon=":material/check_circle:")
 
 	del st.session_state["message"]
+
+st.sidebar.caption(banco.esperas(engine))
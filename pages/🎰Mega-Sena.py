@@ -1,11 +1,18 @@
 import locale
-from collections import Counter
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
 from datetime import date
 
+import numpy as np
 import pandas as pd
+import plotly.express as px
 import streamlit as st
 from streamlit.delta_generator import DeltaGenerator
 
+from utils import megasena_polars, megasena_store
+from utils.megasena import (Historico, Historicos, Processos, avaliar_paralelo, decode, encode_apostas,
+                            hit_matrix, ler_apostas, simular)
+
 locale.setlocale(locale.LC_ALL, "pt_BR.UTF-8")
 
 minhas_apostas: list[str] = [
@@ -36,52 +43,125 @@ months: list[str] = [
 	"julho", "agosto", "setembro", "outubro", "novembro", "dezembro"
 ]
 
+rotulos: list[str] = [f"{bola:02}" for bola in range(1, 61)]
+
+colunas: list[str] = ["id_sorteio", "dt_texto", "bolas", "winners_6x", "rateios_6x", "winners_5x", "rateios_5x",
+                       "winners_4x", "rateios_4x"]
+
+estrategias: dict[str, str] = {"aleatoria": "Aleatória", "quentes": "Bolas quentes", "frias": "Bolas frias"}
+
+
+@st.cache_resource
+def historicos(apostas: tuple[str, ...]) -> Historicos:
+	return Historicos(encode_apostas(apostas))
+
+
+def load_megasena(chave: str) -> Historico:
+	with st.spinner("⏳Obtendo os dados, aguarde..."):
+		return historicos(tuple(minhas_apostas)).get(chave)
+
+
+@st.cache_resource
+def executor() -> ProcessPoolExecutor:
+	return ProcessPoolExecutor(mp_context=Processos())
+
+
+@st.cache_data(show_spinner="⏳Conferindo as apostas, aguarde...")
+def conferir_apostas(conteudo: bytes, chave: str, _historico: Historico) -> tuple[pd.DataFrame, list[int]]:
+	apostas, invalidas = ler_apostas(conteudo.decode("utf-8", errors="ignore"))
+	
+	resumo: pd.DataFrame = avaliar_paralelo(encode_apostas(apostas), _historico.mascaras, _historico.rateios, executor())
+	resumo.insert(0, "aposta", apostas)
+	
+	return resumo, invalidas
+
 
-@st.cache_data(show_spinner="⏳Obtendo os dados, aguarde...", ttl=1)
-def load_megasena() -> pd.DataFrame:
-	df: pd.DataFrame = pd.read_excel(st.session_state["xlsx_file"], engine="openpyxl")
+@st.fragment(run_every=1)
+def acompanhar_simulacao() -> None:
+	# Só é chamado enquanto há lotes em andamento: ao terminar, o resumo é somado uma vez, guardado na sessão, e a
+	# página inteira roda de novo, já sem o fragmento (e sem o refresh a cada segundo).
+	simulacao: dict = st.session_state["simulacao"]
+	futuros: list[Future] = simulacao["futuros"]
+	prontos: int = sum(futuro.done() for futuro in futuros)
+	
+	if prontos == len(futuros):
+		resultados: list[tuple[np.ndarray, float]] = [futuro.result() for futuro in futuros]
+		
+		st.session_state["simulacao"] = {
+			"quantidade": simulacao["quantidade"],
+			"preco": simulacao["preco"],
+			"distribuicao": np.sum([resultado[0] for resultado in resultados], axis=0),
+			"premio": sum(resultado[1] for resultado in resultados),
+		}
+		st.rerun()
+	
+	st.progress(prontos / len(futuros), text=f"⏳Simulando: {prontos} de {len(futuros)} lotes...")
 	
-	df["Data do Sorteio"] = pd.to_datetime(df["Data do Sorteio"], format="%d/%m/%Y")
-	df.insert(2,"Bolas",df[[f"Bola{i}" for i in range(1, 7)]].astype(str) \
-	          .apply(lambda rows: " ".join(val.zfill(2) for val in rows), axis=1))
+	if st.button("**Cancelar**", type="primary", icon=":material/cancel:"):
+		for futuro in futuros:
+			futuro.cancel()
+		
+		del st.session_state["simulacao"]
+		st.rerun()
+
+
+def mostrar_simulacao(simulacao: dict) -> None:
+	distribuicao: np.ndarray = simulacao["distribuicao"]
+	retorno: float = simulacao["premio"] / distribuicao.sum()
 	
-	for coluna in ["Rateio 6 acertos", "Rateio 5 acertos", "Rateio 4 acertos"]:
-		df[coluna] = (df[coluna].astype(str).replace(r"\D", "", regex=True).astype(float) / 100)
+	with st.container(horizontal=True):
+		st.metric("Apostas simuladas", f"{simulacao['quantidade']:n}")
+		st.metric("Acertos por sorteio", f"{(np.arange(7) * distribuicao).sum() / distribuicao.sum():.4f}")
+		st.metric("Retorno por aposta", locale.currency(retorno, grouping=True))
+		st.metric("Retorno sobre o custo", f"{retorno / simulacao['preco']:.2%}")
 	
-	df.drop(
-		labels=["Bola1", "Bola2", "Bola3", "Bola4", "Bola5", "Bola6", "Cidade / UF", "Acumulado 6 acertos",
-		        "Arrecadação Total", "Estimativa prêmio", "Acumulado Sorteio Especial Mega da Virada", "Observação"],
-		axis=1,
-		inplace=True,
+	st.dataframe(
+		data={
+			"Acertos": range(7),
+			"Ocorrências": distribuicao.tolist(),
+			"Frequência": (distribuicao / distribuicao.sum()).tolist(),
+		},
+		width="content",
+		hide_index=True,
+		column_config={"Frequência": st.column_config.NumberColumn(format="%.8f")},
+		row_height=25,
 	)
-	df.columns = [
-		"id_sorteio", "dt_sorteio", "bolas", "winners_6x", "rateios_6x",
-		"winners_5x", "rateios_5x", "winners_4x", "rateios_4x"
-	]
-	df = df.sort_values(by=["id_sorteio", "dt_sorteio"], ignore_index=True)
+
+
+def analisar_pandas() -> tuple[pd.DataFrame, pd.DataFrame]:
+	i_sorteio, i_aposta = np.nonzero(acertos >= 4)
+	
+	premiados: pd.DataFrame = pd.DataFrame({
+		"id_sorteio": megasena["id_sorteio"].to_numpy()[i_sorteio],
+		"dt_texto": megasena["dt_texto"].to_numpy()[i_sorteio],
+		"aposta": i_aposta + 1,
+		"acertos": acertos[i_sorteio, i_aposta],
+		"comum": sorteios[i_sorteio] & apostas[i_aposta],
+	})
+	
+	return megasena.iloc[anual.loc[anual.index != date.today().year, "fim"]], premiados
+
+
+def analisar_polars() -> tuple[pd.DataFrame, pd.DataFrame]:
+	virada, premiados = megasena_polars.analisar(chave, apostas.tolist(), date.today().year)
+	virada, premiados = virada.to_pandas(), premiados.to_pandas()
+	
+	virada.insert(1, "dt_texto", virada["dt_sorteio"].dt.strftime("%x (%a)"))
+	premiados.insert(1, "dt_texto", premiados["dt_sorteio"].dt.strftime("%x (%a)"))
 	
-	return df
+	return virada, premiados
 
 
 def set_abas(n_match: int, aba: DeltaGenerator) -> None:
+	sorteados: pd.DataFrame = premiados[premiados["acertos"].eq(n_match)]
+	
 	mega_copy: dict[str, list[int | str]] = {
-		"Concurso": [],
-		"Data do Sorteio": [],
-		"Bolas Acertadas": [],
-		"Sua aposta": [],
+		"Concurso": sorteados["id_sorteio"].astype(str).str.zfill(4).tolist(),
+		"Data do Sorteio": sorteados["dt_texto"].tolist(),
+		"Bolas Acertadas": [decode(mask) for mask in sorteados["comum"]],
+		"Sua aposta": sorteados["aposta"].tolist(),
 	}
 	
-	for row in megasena[["id_sorteio", "dt_sorteio", "bolas"]].copy().itertuples(index=False, name=None):
-		for aposta in minhas_apostas:
-			acertos: set[int] = set(map(int, aposta.split()))
-			match: set[int] = set(map(int, row[2].split())) & acertos
-			
-			if len(match) == n_match:
-				mega_copy["Concurso"].append(str(row[0]).zfill(4))
-				mega_copy["Data do Sorteio"].append(row[1].strftime("%x (%a)"))
-				mega_copy["Bolas Acertadas"].append(" ".join(f"{n:02}" for n in sorted(match)))
-				mega_copy["Sua aposta"].append(minhas_apostas.index(aposta) + 1)
-	
 	aba.dataframe(
 		data=mega_copy,
 		hide_index=True,
@@ -91,12 +171,31 @@ def set_abas(n_match: int, aba: DeltaGenerator) -> None:
 
 
 st.file_uploader("Importar", type=["xlsx"], key="xlsx_file", label_visibility="hidden", width=250)
+st.sidebar.radio("**Motor:**", options=["pandas", "polars"], key="motor", horizontal=True)
 
 if st.session_state["xlsx_file"] is not None and st.session_state["xlsx_file"].name == "Mega-Sena.xlsx":
-	megasena: pd.DataFrame = load_megasena()
+	with st.spinner("⏳Convertendo a planilha, aguarde..."):
+		chave: str = megasena_store.ingest(
+			st.session_state["xlsx_file"].getvalue(),
+			megasena_polars.read_xlsx if st.session_state["motor"] == "polars" else megasena_store.read_xlsx,
+		)
+	
+	# O histórico é o do store desta sessão e não muda depois de montado: tudo abaixo vem do mesmo retrato.
+	historico: Historico = load_megasena(chave)
+	megasena: pd.DataFrame = historico.df
+	sorteios: np.ndarray = historico.mascaras
+	rateios: np.ndarray = historico.rateios
+	apostas: np.ndarray = historico.apostas
+	acertos: np.ndarray = historico.acertos
+	anual: pd.DataFrame = historico.anual
+	
+	inicio: float = time.perf_counter()
+	mega_da_virada, premiados = analisar_polars() if st.session_state["motor"] == "polars" else analisar_pandas()
+	st.sidebar.caption(f"Análises em {(time.perf_counter() - inicio) * 1000:.1f} ms ({st.session_state['motor']})")
 	
-	tab1, tab2, tab3, tab4, tab5 = st.tabs(["**Minhas apostas**", "**Apostas Sorteadas**", "**Contador de bolas**",
-	                                        "**Sua aposta da Mega-Sena**", "**Mega-Sena da Virada**"])
+	tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["**Minhas apostas**", "**Apostas Sorteadas**",
+	                                              "**Contador de bolas**", "**Sua aposta da Mega-Sena**",
+	                                              "**Mega-Sena da Virada**", "**Simulação**"])
 	
 	with tab1:
 		col1, col2 = st.columns([1.3, 2.8])
@@ -133,19 +232,18 @@ if st.session_state["xlsx_file"] is not None and st.session_state["xlsx_file"].n
 			st.slider("**Ano:**", min_value=1996, max_value=date.today().year, value=date.today().year, key="ano")
 		
 		with col2:
-			all_mega: pd.DataFrame = megasena[
-				megasena["dt_sorteio"].dt.year.eq(st.session_state["ano"])
-				& megasena["dt_sorteio"].dt.month.eq(months.index(st.session_state["mês"]))
-			].copy()
-			all_mega["dt_sorteio"] = all_mega["dt_sorteio"].dt.strftime("%x (%a)")
+			all_mega: pd.DataFrame = megasena.iloc[
+				historico.mes(st.session_state["ano"], months.index(st.session_state["mês"]))
+			]
 			
 			st.dataframe(
 				data=all_mega,
 				width="content",
 				hide_index=True,
+				column_order=colunas,
 				column_config={
 					"id_sorteio": st.column_config.NumberColumn("Concurso", format="%04d", pinned=True),
-					"dt_sorteio": st.column_config.TextColumn("Data do Sorteio", pinned=True),
+					"dt_texto": st.column_config.TextColumn("Data do Sorteio", pinned=True),
 					"bolas": st.column_config.TextColumn("Bolas Sorteadas"),
 					"winners_6x": st.column_config.NumberColumn("Acertos 6x", format="%d"),
 					"rateios_6x": st.column_config.NumberColumn("Rateios 6x", format="dollar"),
@@ -159,56 +257,49 @@ if st.session_state["xlsx_file"] is not None and st.session_state["xlsx_file"].n
 			)
 	
 	with tab3:
-		bolas: Counter[int] = Counter(
-			bola
-			for row in megasena[["bolas"]].copy().itertuples(index=False, name=None)
-			for bola in row[0].split()
-		)
+		st.columns(4)[0].slider("**Últimos sorteios:**", min_value=10, max_value=len(megasena), value=len(megasena),
+		                        step=10, key="janela")
 		
-		col1, col2, col3, col4, col5, col6 = st.columns(6)
+		contagem: np.ndarray = historico.frequencias(st.session_state["janela"])
+		ranking: list[tuple[int, int]] = [
+			(int(bola), int(contagem[bola])) for bola in np.argsort(-contagem[1:], kind="stable") + 1
+		]
 		
-		col1.dataframe(
-			data=sorted(bolas.items(), key=lambda item: item[1], reverse=True)[:10],
-			column_config={
-				1: st.column_config.NumberColumn("Bolas", format="%02d"),
-				2: st.column_config.NumberColumn("Acertos"),
-			},
-		)
-		col2.dataframe(
-			data=sorted(bolas.items(), key=lambda item: item[1], reverse=True)[10:20],
-			column_config={
-				1: st.column_config.NumberColumn("Bolas", format="%02d"),
-				2: st.column_config.NumberColumn("Acertos"),
-			},
-		)
-		col3.dataframe(
-			data=sorted(bolas.items(), key=lambda item: item[1], reverse=True)[20:30],
-			column_config={
-				1: st.column_config.NumberColumn("Bolas", format="%02d"),
-				2: st.column_config.NumberColumn("Acertos"),
-			},
-		)
-		col4.dataframe(
-			data=sorted(bolas.items(), key=lambda item: item[1], reverse=True)[30:40],
-			column_config={
-				1: st.column_config.NumberColumn("Bolas", format="%02d"),
-				2: st.column_config.NumberColumn("Acertos"),
-			},
-		)
-		col5.dataframe(
-			data=sorted(bolas.items(), key=lambda item: item[1], reverse=True)[40:50],
-			column_config={
-				1: st.column_config.NumberColumn("Bolas", format="%02d"),
-				2: st.column_config.NumberColumn("Acertos"),
-			},
-		)
-		col6.dataframe(
-			data=sorted(bolas.items(), key=lambda item: item[1], reverse=True)[50:],
-			column_config={
-				1: st.column_config.NumberColumn("Bolas", format="%02d"),
-				2: st.column_config.NumberColumn("Acertos"),
-			},
-		)
+		for col, inicio in zip(st.columns(6), range(0, 60, 10)):
+			col.dataframe(
+				data=ranking[inicio:inicio + 10],
+				column_config={
+					1: st.column_config.NumberColumn("Bolas", format="%02d"),
+					2: st.column_config.NumberColumn("Acertos"),
+				},
+			)
+		
+		col1, col2 = st.columns(2)
+		
+		with col1:
+			pares: np.ndarray = historico.pares[1:, 1:].copy()
+			np.fill_diagonal(pares, 0)
+			
+			st.plotly_chart(
+				px.imshow(pares, x=rotulos, y=rotulos, color_continuous_scale="Viridis", title="Pares sorteados juntos")
+				.update_layout(margin=dict(l=0, r=0, t=30, b=0)),
+				key="heatmap_pares",
+			)
+		
+		with col2:
+			st.select_slider("**Trios com a bola:**", options=range(1, 61), key="bola_trio",
+			                 format_func=lambda bola: f"{bola:02}")
+			
+			trios: np.ndarray = historico.trios(st.session_state["bola_trio"])[1:, 1:]
+			np.fill_diagonal(trios, 0)
+			trios[st.session_state["bola_trio"] - 1, :] = trios[:, st.session_state["bola_trio"] - 1] = 0
+			
+			st.plotly_chart(
+				px.imshow(trios, x=rotulos, y=rotulos, color_continuous_scale="Viridis",
+				          title=f"Trios com a bola {st.session_state['bola_trio']:02}")
+				.update_layout(margin=dict(l=0, r=0, t=30, b=0)),
+				key="heatmap_trios",
+			)
 	
 	with tab4:
 		st.columns(5)[0].text_input("Sua aposta:", key="sua_aposta", placeholder="01 02 03 04 05 06")
@@ -223,17 +314,16 @@ if st.session_state["xlsx_file"] is not None and st.session_state["xlsx_file"].n
 		}
 		
 		if st.session_state["btn_acertas"]:
-			if st.session_state["sua_aposta"]:
-				sua_aposta: set[int] = set(map(int, st.session_state["sua_aposta"].split()))
+			# Mesma regra da importação (6 a 20 bolas diferentes, de 01 a 60) antes de virar máscara de bits.
+			if suas := ler_apostas(st.session_state["sua_aposta"])[0]:
+				sua_aposta: np.ndarray = encode_apostas(suas[:1])
+				matches: np.ndarray = hit_matrix(sorteios, sua_aposta)[:, 0] >= 4
+				sorteados: pd.DataFrame = megasena[matches]
 				
-				for row in megasena.copy().itertuples(index=False, name=None):
-					matches: set[int] = set(map(int, row[2].split())) & sua_aposta
-					
-					if len(matches) >= 4:
-						mega_copy2["Concurso"].append(row[0])
-						mega_copy2["Data de Sorteio"].append(row[1].strftime("%x (%a)"))
-						mega_copy2["Bolas Sorteadas"].append(row[2])
-						mega_copy2["Seus Acertos"].append(" ".join(f"{n:02}" for n in sorted(matches)))
+				mega_copy2["Concurso"] = sorteados["id_sorteio"].tolist()
+				mega_copy2["Data de Sorteio"] = sorteados["dt_texto"].tolist()
+				mega_copy2["Bolas Sorteadas"] = sorteados["bolas"].tolist()
+				mega_copy2["Seus Acertos"] = [decode(mask) for mask in sorteios[matches] & sua_aposta[0]]
 				
 				st.columns([2.5, 1, 1])[0].dataframe(
 					data=mega_copy2,
@@ -242,25 +332,47 @@ if st.session_state["xlsx_file"] is not None and st.session_state["xlsx_file"].n
 					row_height=25,
 				)
 				st.button("**Limpar**", type="primary", icon=":material/mop:")
+			elif st.session_state["sua_aposta"]:
+				st.toast("**Aposta inválida:** de 6 a 20 bolas diferentes, de 01 a 60!", icon=":material/warning:")
 			else:
 				st.toast("**Preencha suas bolas!**", icon=":material/warning:")
+		
+		st.divider()
+		st.file_uploader("**Importar apostas (uma por linha):**", type=["csv", "txt"], key="apostas_file", width=400)
+		
+		if st.session_state["apostas_file"] is not None:
+			resumo, invalidas = conferir_apostas(st.session_state["apostas_file"].getvalue(), historico.chave, historico)
+			
+			if invalidas:
+				st.toast(f"**{len(invalidas)} linha(s) inválida(s) ignorada(s)...**", icon=":material/warning:")
+			
+			st.dataframe(
+				data=resumo,
+				width="content",
+				hide_index=True,
+				column_config={
+					"aposta": st.column_config.TextColumn("Aposta", pinned=True),
+					"melhor": st.column_config.NumberColumn("Melhor acerto", format="%d"),
+					"quadras": st.column_config.NumberColumn("Quadras", format="%d"),
+					"quinas": st.column_config.NumberColumn("Quinas", format="%d"),
+					"senas": st.column_config.NumberColumn("Senas", format="%d"),
+					"premio": st.column_config.NumberColumn("Prêmio", format="dollar"),
+				},
+				row_height=25,
+			)
+			
+			st.markdown(f"**{len(resumo)} apostas -> Prêmio total: "
+			            f"{locale.currency(resumo['premio'].sum(), grouping=True)}**")
 	
 	with tab5:
-		mega_da_virada: pd.DataFrame = megasena.copy()
-		mega_da_virada["ano"] = mega_da_virada["dt_sorteio"].dt.year
-		mega_da_virada = mega_da_virada[mega_da_virada["dt_sorteio"] \
-			.isin(mega_da_virada[mega_da_virada["ano"] != date.today().year] \
-		          .groupby(["ano"])["dt_sorteio"].transform("max"))] \
-			.reset_index(drop=True).drop(["ano"], axis=1)
-		mega_da_virada["dt_sorteio"] = mega_da_virada["dt_sorteio"].dt.strftime("%x (%a)")
-		
 		st.dataframe(
 			data=mega_da_virada,
 			width="content",
 			hide_index=True,
+			column_order=colunas,
 			column_config={
 				"id_sorteio": st.column_config.NumberColumn("Concurso", format="%04d", pinned=True),
-				"dt_sorteio": st.column_config.TextColumn("Data do Sorteio", pinned=True),
+				"dt_texto": st.column_config.TextColumn("Data do Sorteio", pinned=True),
 				"bolas": st.column_config.TextColumn("Bolas Sorteadas"),
 				"winners_6x": st.column_config.NumberColumn("6x", format="%d"),
 				"rateios_6x": st.column_config.NumberColumn("Rateios 6x", format="dollar"),
@@ -271,3 +383,53 @@ if st.session_state["xlsx_file"] is not None and st.session_state["xlsx_file"].n
 			},
 			row_height=25,
 		)
+		
+		st.markdown("**Prêmios por ano**")
+		st.dataframe(
+			data=anual.drop(columns="fim").sort_index(ascending=False),
+			width="content",
+			column_config={
+				"ano": st.column_config.NumberColumn("Ano", format="%d", pinned=True),
+				"id_sorteio": st.column_config.NumberColumn("Último concurso", format="%04d"),
+				"sorteios": st.column_config.NumberColumn("Sorteios", format="%d"),
+				"ganhadores_6x": st.column_config.NumberColumn("Ganhadores 6x", format="%d"),
+				"pago_6x": st.column_config.NumberColumn("Pago 6x", format="dollar"),
+				"pago_5x": st.column_config.NumberColumn("Pago 5x", format="dollar"),
+				"pago_4x": st.column_config.NumberColumn("Pago 4x", format="dollar"),
+				"maior_rateio_6x": st.column_config.NumberColumn("Maior rateio 6x", format="dollar"),
+			},
+			row_height=25,
+		)
+	
+	with tab6:
+		with st.container(horizontal=True, vertical_alignment="bottom"):
+			st.selectbox("**Estratégia:**", options=list(estrategias), format_func=lambda x: estrategias.get(x),
+			             key="estrategia", width=200)
+			st.number_input("**Apostas:**", min_value=50_000, max_value=10_000_000, value=1_000_000, step=50_000,
+			                key="qtd_simulacao", width=200)
+			st.number_input("**Preço da aposta:**", min_value=0.01, value=6.0, format="%.2f", key="preco", width=150)
+			simular_agora: bool = st.button("**Simular**", type="primary", icon=":material/casino:")
+		
+		if simular_agora:
+			for futuro in st.session_state.get("simulacao", {}).get("futuros", []):
+				futuro.cancel()
+			
+			frequencias: np.ndarray = np.maximum(historico.frequencias()[1:], 1).astype(np.float64)
+			pesos: np.ndarray | None = {"aleatoria": None, "quentes": frequencias, "frias": 1 / frequencias} \
+				.get(st.session_state["estrategia"])
+			lote: int = 50_000
+			quantidade: int = st.session_state["qtd_simulacao"]
+			
+			st.session_state["simulacao"] = {
+				"quantidade": quantidade,
+				"preco": st.session_state["preco"],
+				"futuros": [
+					executor().submit(simular, semente, min(lote, quantidade - i * lote), pesos, sorteios, rateios)
+					for i, semente in enumerate(np.random.SeedSequence().spawn(-(-quantidade // lote)))
+				],
+			}
+		
+		if "futuros" in (simulacao := st.session_state.get("simulacao", {})):
+			acompanhar_simulacao()
+		elif simulacao:
+			mostrar_simulacao(simulacao)
@@ -4,71 +4,122 @@ from datetime import date
 import pandas as pd
 import plotly.express as px
 import streamlit as st
-from streamlit.connections import SQLConnection
+from sqlalchemy import Engine
+
+from utils import banco, salario
 
 locale.setlocale(locale.LC_ALL, "pt_BR.UTF-8")
 
-engine: SQLConnection = SQLConnection("SQLite3")
+engine: Engine = banco.conexao("SQLite3")
 
-months: list[str] = ["", "jan", "fev", "mar", "abr", "mai", "jun", "jul", "ago", "set", "out", "nov", "dez"]
+months: list[str] = ["", *salario.MESES]
 
+banco.preparar(str(engine.url), "salario", engine, salario.MIGRACOES)
 
-@st.cache_data(show_spinner="⏳Obtendo os dados, aguarde...", ttl=1)
-def last_period() -> int:
-	return engine.query("SELECT MAX(período) AS MAIOR FROM mirrors").loc[0, "MAIOR"]  # ty:ignore[invalid-return-type]
+# Os caches só expiram quando mirrors muda: a versão (mantida por gatilhos) faz parte da chave.
+versao: int = banco.versao(engine, "mirrors")
 
 
-@st.cache_data(show_spinner="⏳Obtendo os dados, aguarde...", ttl=1)
-def load_extract_monthly(_period: int) -> pd.DataFrame:
-	load: pd.DataFrame = engine.query(
-		sql="""
-			SELECT l.lançamento, m.período, m.acerto, m.valor
-			FROM mirrors m INNER JOIN lances l ON l.id_lançamento = m.id_lançamento
-			WHERE m.período = :value
-			ORDER BY m.acerto DESC, m.valor DESC
-		""",
-		params=dict(value=_period)
-	)
-	load["período"] = pd.to_datetime(load["período"], format="%Y%m").dt.strftime("%b / %Y")
+@st.cache_data(show_spinner="⏳Obtendo os dados, aguarde...", max_entries=2)
+def last_period(versao: int) -> int:
+	return banco.ler(engine, "SELECT MAX(período) AS MAIOR FROM mirrors").loc[0, "MAIOR"]  # ty:ignore[invalid-return-type]
+
+
+@st.cache_data(show_spinner="⏳Obtendo os dados, aguarde...", max_entries=32)
+def load_extract_monthly(period: int, versao: int) -> pd.DataFrame:
+	load: pd.DataFrame = banco.ler(engine, salario.EXTRATO_MENSAL, params=dict(value=period))
+	load["período"] = salario.rotular(period)
 	return load
 
 
-@st.cache_data(show_spinner="⏳Obtendo os dados, aguarde...", ttl=1)
-def load_extract_annual(_year: int) -> pd.DataFrame:
-	load: pd.DataFrame = engine.query(
-		sql="""
-			SELECT l.lançamento, m.período, m.acerto, m.valor
-			FROM mirrors m INNER JOIN main.lances l ON l.id_lançamento = m.id_lançamento
-			WHERE CAST(período / 100 AS INTEGER) = :value
-		""",
-		params=dict(value=_year)
-	)
-	load["mês"] = pd.to_datetime(load["período"], format="%Y%m").dt.strftime("%b")
-	load = load.pivot(columns="mês", index=["lançamento", "acerto"], values="valor").reset_index().fillna(value=0)
-	reindex_columns: list[str] = ["lançamento", "acerto"] + [coluna for coluna in months[1:] if coluna in load.columns]
-	load = load[reindex_columns]
-	load["média"] = load[load.columns[2:]].mean(axis=1)
-	load["total"] = load[load.columns[2:-1]].sum(axis=1)
+@st.cache_data(show_spinner="⏳Obtendo os dados, aguarde...", max_entries=32)
+def load_extract_annual(year: int, versao: int) -> pd.DataFrame:
+	load: pd.DataFrame = banco.ler(engine, salario.EXTRATO_ANUAL, params=salario.faixa(year))
+	load = salario.pivotar(
+		pd.MultiIndex.from_frame(load[["lançamento", "acerto"]]), load["período"].to_numpy(), load["valor"].to_numpy()
+	).reset_index()
 	load = load.sort_values(["acerto", "total"], ascending=[False, False])
 	return load
 
 
-@st.cache_data(show_spinner="⏳Obtendo os dados, aguarde...", ttl=1)
-def load_total_annual() -> pd.DataFrame:
-	load: pd.DataFrame = engine.query("SELECT período, valor FROM mirrors") \
-		.groupby(["período"])["valor"].sum().reset_index()
-	load["ano"] = pd.to_datetime(load["período"], format="%Y%m").dt.year
-	load["mês"] = pd.to_datetime(load["período"], format="%Y%m").dt.strftime("%b")
-	load = load.pivot(columns="mês", index="ano", values="valor").fillna(0)
-	load = load[[coluna for coluna in months[1:] if coluna in load.columns]]
-	load["média"] = load.mean(axis=1)
-	load["total"] = load[load.columns[:-1]].sum(axis=1)
-	return load
+@st.cache_data(show_spinner="⏳Obtendo os dados, aguarde...", max_entries=2)
+def load_total_annual(versao: int) -> pd.DataFrame:
+	load: pd.DataFrame = banco.ler(engine, salario.TOTAL_ANUAL)
+	return salario.pivotar(
+		pd.Index(load["período"].to_numpy() // 100, name="ano"), load["período"].to_numpy(), load["valor"].to_numpy()
+	)
+
+
+@st.cache_data(show_spinner="⏳Montando o gráfico, aguarde...", max_entries=32)
+def load_chart(year: int, versao: int) -> dict:
+	# Dados, rótulos já formatados e o figure pronto do ano: mover o slider só troca de entrada no cache.
+	load: pd.DataFrame = banco.ler(engine, salario.GRAFICO, params=salario.faixa(year))
+	chart: pd.DataFrame = pd.DataFrame({"mês": [months[mes] for mes in load["mês"]], "salário": load["valor"]})
+	labels: list[str] = [locale.currency(valor, grouping=True) for valor in load["valor"]]
+
+	fig = px.bar(
+		data_frame=chart,
+		x="mês",
+		y="salário",
+		title=f"Espelho {year}",
+		text=labels,
+		color="salário",
+		color_continuous_scale="Viridis",
+	).update_layout(
+		xaxis_title="",
+		yaxis_title="",
+		xaxis=dict(showline=True, linewidth=1, linecolor="gray", showgrid=True),
+		yaxis=dict(showticklabels=False),
+		showlegend=False,
+		coloraxis_showscale=True,
+		template="presentation",
+		margin=dict(l=0, r=0, t=30, b=0),
+		font=dict(size=13, color="white"),
+	).update_traces(
+		textposition="outside",
+		textfont=dict(size=9, color="black"),
+		hovertemplate="%{text}<extra></extra>",
+	)
+
+	return dict(meses=chart["mês"].tolist(), valores=chart["salário"].tolist(), rotulos=labels, figura=fig.to_dict())
+
+
+@st.cache_data(show_spinner="⏳Montando o gráfico, aguarde...", max_entries=16)
+def load_comparison(years: tuple[int, ...], versao: int) -> dict:
+	# Monta a comparação a partir dos mesmos payloads por ano (já em cache depois do primeiro uso).
+	payloads: dict[int, dict] = {year: load_chart(year, versao) for year in years}
+	chart: pd.DataFrame = pd.DataFrame({
+		"ano": [str(year) for year, payload in payloads.items() for _ in payload["meses"]],
+		"mês": [mes for payload in payloads.values() for mes in payload["meses"]],
+		"salário": [valor for payload in payloads.values() for valor in payload["valores"]],
+		"rótulo": [rotulo for payload in payloads.values() for rotulo in payload["rotulos"]],
+	})
+
+	return px.bar(
+		data_frame=chart,
+		x="mês",
+		y="salário",
+		color="ano",
+		barmode="group",
+		title="Comparativo anual",
+		custom_data=["rótulo"],
+		category_orders={"mês": months[1:]},
+	).update_layout(
+		xaxis_title="",
+		yaxis_title="",
+		xaxis=dict(showline=True, linewidth=1, linecolor="gray", showgrid=True),
+		yaxis=dict(showticklabels=False),
+		template="presentation",
+		margin=dict(l=0, r=0, t=30, b=0),
+		font=dict(size=13),
+	).update_traces(
+		hovertemplate="%{customdata[0]}<extra>%{fullData.name}</extra>",
+	).to_dict()
 
 
 @st.dialog(title=f"Salário de {date.today():%B de %Y}", width="medium")
 def new_data() -> None:
-	load: pd.DataFrame = engine.query("SELECT id_lançamento, lançamento FROM lances ORDER BY lançamento")
+	load: pd.DataFrame = banco.ler(engine, "SELECT id_lançamento, lançamento FROM lances ORDER BY lançamento")
 	get: dict[int, str] = dict(zip(load["id_lançamento"], load["lançamento"]))
 
 	st.data_editor(
@@ -87,8 +138,8 @@ def new_data() -> None:
 				width=50,
 				required=True,
 				default=date.today().year * 100 + date.today().month,
-				min_value=200507,
-				max_value=203512,
+				min_value=salario.PERIODO_MINIMO,
+				max_value=salario.PERIODO_MAXIMO,
 			),
 			"acerto": st.column_config.CheckboxColumn(
 				label="Acerto",
@@ -108,26 +159,54 @@ def new_data() -> None:
 		num_rows="dynamic",
 	)
 
+	with st.expander("**Importar em lote**", icon=":material/upload_file:"):
+		st.file_uploader("**Arquivo CSV ou XLSX:**", type=["csv", "xlsx"], key="lote_file")
+		st.text_area("**Ou cole as linhas (CSV):**", key="lote_text", placeholder="lançamento;período;acerto;valor")
+
+		validas: pd.DataFrame = pd.DataFrame()
+
+		try:
+			if st.session_state["lote_file"] is not None:
+				validas, invalidas = salario.validar(
+					salario.ler_lote(st.session_state["lote_file"].getvalue(),
+					                 xlsx=st.session_state["lote_file"].name.endswith(".xlsx")), get
+				)
+			elif st.session_state["lote_text"]:
+				validas, invalidas = salario.validar(salario.ler_lote(st.session_state["lote_text"]), get)
+			else:
+				invalidas = pd.DataFrame()
+		except ValueError as error:
+			st.warning(f"**{error}**", icon=":material/warning:")
+		else:
+			if not invalidas.empty:
+				st.warning(f"**{len(invalidas)} linhas rejeitadas:**", icon=":material/warning:")
+				st.dataframe(invalidas, hide_index=True, row_height=25)
+
+		st.button(f"**Importar {len(validas)} linhas**", key="import", type="primary", icon=":material/upload:",
+		          disabled=validas.empty)
+
 	with st.container(horizontal=True, horizontal_alignment="center", gap="medium"):
 		st.button("**Salvar**", key="save", type="primary", icon=":material/save:")
 		st.button("**Cancelar**", key="cancel", type="primary", icon=":material/cancel:")
 
 	if st.session_state["save"]:
 		if st.session_state["editor"]["added_rows"]:
-			with engine.engine.connect() as conn:
-				pd.DataFrame(st.session_state["editor"]["added_rows"]) \
-					.to_sql("mirrors", con=conn, if_exists="append", index=False)
+			salario.inserir(engine, pd.DataFrame(st.session_state["editor"]["added_rows"]))
 
 			st.session_state["toast_msg"] = "save"
-			st.cache_data.clear()
 			st.rerun()
 
+	if st.session_state["import"]:
+		st.session_state["importados"] = salario.inserir(engine, validas)
+		st.session_state["toast_msg"] = "import"
+		st.rerun()
+
 	if st.session_state["cancel"]:
 		st.session_state["toast_msg"] = "cancel"
 		st.rerun()
 
 
-get_year, get_month = divmod(last_period(), 100)
+get_year, get_month = divmod(last_period(versao), 100)
 
 tab1, tab2, tab3, tab4 = st.tabs(["**Extrato Mensal**", "**Extrato Anual**", "**Total Anual**", "**Gráfico**"])
 
@@ -140,7 +219,7 @@ with tab1:
 		st.button("**Incluir Salário**", on_click=new_data, type="primary", icon=":material/add_circle:")
 	
 	df1: pd.DataFrame = load_extract_monthly(
-		st.session_state["select_year"] * 100 + months.index(st.session_state["slider_months"])
+		st.session_state["select_year"] * 100 + months.index(st.session_state["slider_months"]), versao
 	)
 	
 	with col2:
@@ -162,7 +241,7 @@ with tab1:
 with tab2:
 	st.slider("**Ano:**", min_value=2005, max_value=date.today().year, value=get_year, key="slider_years")
 
-	df2: pd.DataFrame = load_extract_annual(st.session_state["slider_years"])
+	df2: pd.DataFrame = load_extract_annual(st.session_state["slider_years"], versao)
 
 	cols: list[str] = months[1:] + ["média", "total"]
 
@@ -178,7 +257,7 @@ with tab2:
 	)
 
 with tab3:
-	df3: pd.DataFrame = load_total_annual()
+	df3: pd.DataFrame = load_total_annual(versao)
 
 	with st.container():
 		st.data_editor(
@@ -191,44 +270,25 @@ with tab3:
 
 with tab4:
 	st.slider("**Ano:**", min_value=2005, max_value=date.today().year, value=get_year, key="slider_graphic")
+	st.plotly_chart(load_chart(st.session_state["slider_graphic"], versao)["figura"])
 
-	df4: pd.DataFrame = load_total_annual()
-	df4 = df4[df4.columns[:-2]] \
-		.loc[st.session_state["slider_graphic"]] \
-		.reset_index() \
-		.rename(columns={st.session_state["slider_graphic"]: "salário"})
+	st.multiselect("**Comparar anos:**", options=range(date.today().year, 2004, -1), default=[get_year - 1, get_year],
+	               key="compare_years")
 
-	fig = px.bar(
-		data_frame=df4,
-		x="mês",
-		y="salário",
-		title=f"Espelho {st.session_state["slider_graphic"]}",
-		text=df4["salário"].apply(lambda x: locale.currency(x, grouping=True)),
-		color="salário",
-		color_continuous_scale="Viridis",
-	).update_layout(
-		xaxis_title="",
-		yaxis_title="",
-		xaxis=dict(showline=True, linewidth=1, linecolor="gray", showgrid=True),
-		yaxis=dict(showticklabels=False),
-		showlegend=False,
-		coloraxis_showscale=True,
-		template="presentation",
-		margin=dict(l=0, r=0, t=30, b=0),
-		font=dict(size=13, color="white"),
-	).update_traces(
-		textposition="outside",
-		textfont=dict(size=9, color="black"),
-		hovertemplate="%{text}<extra></extra>",
-	)
-
-	st.plotly_chart(fig)
+	if st.session_state["compare_years"]:
+		st.plotly_chart(load_comparison(tuple(sorted(st.session_state["compare_years"])), versao))
 
 if "toast_msg" in st.session_state:
 	if st.session_state["toast_msg"] == "save":
 		st.toast("**Dados salvos com sucesso!**", icon=":material/add_circle:")
 
+	if st.session_state["toast_msg"] == "import":
+		st.toast(f"**{st.session_state.pop('importados')} lançamentos importados com sucesso!**",
+		         icon=":material/upload_file:")
+
 	if st.session_state["toast_msg"] == "cancel":
 		st.toast("**Inclusão cancelada...**", icon=":material/cancel:")
 
 	del st.session_state["toast_msg"]
+
+st.sidebar.caption(banco.esperas(engine))
@@ -1,26 +1,80 @@
 import sqlite3
+import time
+from contextlib import closing
 from datetime import date
 
 import pandas as pd
-import sqlalchemy.exc as sa
 import streamlit as st
-from streamlit.connections import SQLConnection
+from sqlalchemy import Engine
 from streamlit.elements.lib.column_types import ColumnConfig
 
-engine: SQLConnection = SQLConnection("SQLite3")
+from utils import banco, cursos
+
+engine: Engine = banco.conexao("SQLite3")
+
+banco.preparar(str(engine.url), "cursos", engine, cursos.MIGRACOES)
+
+versao: int = banco.versao(engine, "unibb")
+
+page_size: int = 500
+list_size: int = 100
+search_size: int = 50
 
 dict_lzc: dict[int, str] = {0: "UniBB", 1: "Alura"}
 dict_mod: dict[int, str] = {0: "Presencial", 1: "Auto-instrucional"}
 
 
-@st.cache_data
-def load_table() -> pd.DataFrame:
-	return engine.query("SELECT * FROM unibb", show_spinner="Obtendo os dados, aguarde...", ttl=1)
+@st.cache_data(show_spinner="Obtendo os dados, aguarde...", max_entries=32)
+def load_page(after: tuple[str, int, int] | None, versao: int) -> pd.DataFrame:
+	# Uma linha a mais que a página só para saber se existe a próxima; o rowid (id_linha) fica no índice.
+	if after is None:
+		return banco.ler(engine, cursos.PRIMEIRA_PAGINA, params=dict(limite=list_size + 1)).set_index("id_linha")
+
+	return banco.ler(engine, cursos.PROXIMA_PAGINA,
+	                 params=dict(dt_curso=after[0], id_curso=after[1], id_linha=after[2], limite=list_size + 1)) \
+		.set_index("id_linha")
+
+
+@st.cache_data(show_spinner="Obtendo os dados, aguarde...", max_entries=2)
+def load_hours(versao: int) -> pd.DataFrame:
+	return banco.ler(engine, cursos.HORAS)
+
+
+@st.cache_data(show_spinner="Normalizando os nomes, aguarde...", max_entries=2)
+def normalize(versao: int) -> int:
+	return cursos.sincronizar(engine)
+
 
+@st.cache_data(show_spinner="Obtendo os dados, aguarde...", max_entries=2)
+def load_counts(versao: int) -> tuple[int, int]:
+	load: pd.DataFrame = banco.ler(engine, cursos.CONTAGENS)
+	return int(load.loc[0, "cursos"]), int(load.loc[0, "repetidos"])
 
-curse_duplicated: pd.DataFrame = load_table()
-curse_duplicated = curse_duplicated[curse_duplicated.duplicated(subset=["nm_curso"], keep=False)] \
-	.sort_values(by=["nm_curso", "dt_curso", "id_curso"], ascending=[True, True, True])
+
+@st.cache_data(show_spinner="Obtendo os dados, aguarde...", max_entries=2)
+def load_duplicated(versao: int) -> pd.DataFrame:
+	return banco.ler(engine, cursos.DUPLICADOS).drop(columns="nome_normalizado")
+
+
+@st.cache_data(show_spinner="Comparando os nomes, aguarde...", max_entries=8)
+def load_similar(versao: int, limiar: float) -> pd.DataFrame:
+	return cursos.semelhantes(banco.ler(engine, cursos.NOMES), limiar)
+
+
+normalize(versao)
+count_courses, count_duplicated = load_counts(versao)
+
+
+@st.cache_data(show_spinner="Buscando, aguarde...", max_entries=32)
+def search(words: str, page: int, versao: int) -> tuple[pd.DataFrame, int]:
+	params: dict[str, str | int] = dict(termos=words, limite=search_size, inicio=page * search_size)
+	return banco.ler(engine, cursos.BUSCA, params=params), \
+		int(banco.ler(engine, cursos.TOTAL_BUSCA, params=params).loc[0, "total"])
+
+
+def set_query(sql: str | None) -> None:
+	st.session_state["consulta"] = sql
+	st.session_state["pagina"] = 0
 
 
 @st.dialog("Novo Curso")
@@ -43,7 +97,7 @@ def add() -> None:
 
 	if st.container(horizontal_alignment="right").button("Salvar", type="primary", icon=":material/save:"):
 		if all([id_curso, nm_curso, dt_curso, cg_curso, lzc_curso is not None, mod_curso is not None]):
-			with engine.engine.connect() as conn:
+			with engine.begin() as conn:
 				new: dict[str, list[date | int | str]] = {
 					"id_curso": [id_curso], "nm_curso": [nm_curso], "dt_curso": [dt_curso],
 					"cg_curso": [cg_curso], "lzc_curso": [lzc_curso], "mod_curso": [mod_curso],
@@ -51,15 +105,14 @@ def add() -> None:
 				}
 				pd.DataFrame(new).to_sql("unibb", con=conn, if_exists="append", index=False)
 
-			st.cache_data.clear()
 			st.session_state["aviso"] = "add"
 			st.rerun()
 		else:
 			st.warning("**Todos campos :red[*] devem ser preenchidos!**", icon=":material/warning:")
 
 
-dict_opt: dict[int, str] = {1: f"**{len(load_table())} Cursos**",
-							2: f"**{int(len(curse_duplicated) / 2)} Cursos Duplicados**",
+dict_opt: dict[int, str] = {1: f"**{count_courses} Cursos**",
+							2: f"**{count_duplicated} Cursos Duplicados**",
 							3: "**Manual**"}
 st.segmented_control("Opções", options=dict_opt.keys(), format_func=lambda op: dict_opt.get(op), default=1,
 					 key="abas", label_visibility="hidden")
@@ -78,33 +131,129 @@ column_config: dict[str, ColumnConfig] = {
 }
 
 if st.session_state["abas"] == 1:
+	st.text_input("**Buscar:**", key="busca", placeholder="nome, conhecimento ou área", width=400,
+	              on_change=lambda: st.session_state.update(pagina_busca=0))
+	words: str = cursos.termos(st.session_state["busca"])
+
+	if words:
+		page: int = st.session_state.setdefault("pagina_busca", 0)
+		found, total = search(words, page, versao)
+
+		st.dataframe(
+			data=found,
+			hide_index=True,
+			column_config=column_config | {"relevancia": st.column_config.NumberColumn("Relevância", format="%.2f")},
+			row_height=25,
+		)
+
+		with st.container(horizontal=True, vertical_alignment="center"):
+			st.button("**Anterior**", icon=":material/chevron_left:", disabled=page == 0,
+			          on_click=lambda: st.session_state.update(pagina_busca=page - 1))
+			st.button("**Próxima**", icon=":material/chevron_right:", disabled=(page + 1) * search_size >= total,
+			          on_click=lambda: st.session_state.update(pagina_busca=page + 1))
+			st.caption(f"{total} cursos encontrados")
+	else:
+		# Pilha com a última chave (dt_curso, id_curso, rowid) de cada página já vista.
+		keys: list[tuple[str, int, int]] = st.session_state.setdefault("cursores", [])
+		listing: pd.DataFrame = load_page(keys[-1] if keys else None, versao)
+
+		st.dataframe(
+			data=listing.head(list_size),
+			hide_index=True,
+			column_config=column_config,
+			row_height=25,
+		)
+
+		with st.container(horizontal=True, vertical_alignment="center"):
+			st.button("**Anterior**", icon=":material/chevron_left:", disabled=not keys, on_click=keys.pop)
+			st.button("**Próxima**", icon=":material/chevron_right:", disabled=len(listing) <= list_size,
+			          on_click=lambda: keys.append((listing["dt_curso"].iat[list_size - 1],
+			                                        int(listing["id_curso"].iat[list_size - 1]),
+			                                        int(listing.index[list_size - 1]))))
+			st.caption(f"Página {len(keys) + 1} de {max(-(-count_courses // list_size), 1)}")
+
+		st.markdown("**Horas por estudo e módulo**")
+		st.dataframe(
+			data=load_hours(versao),
+			hide_index=True,
+			width="content",
+			column_config={
+				"lzc_curso": column_config["lzc_curso"],
+				"mod_curso": column_config["mod_curso"],
+				"cursos": st.column_config.NumberColumn("Cursos"),
+				"horas": st.column_config.NumberColumn("Horas"),
+			},
+			row_height=25,
+		)
+
+	st.button("**Novo Curso**", on_click=add, type="primary", icon=":material/add_circle:")
+elif st.session_state["abas"] == 2:
 	st.dataframe(
-		data=load_table().sort_values(["dt_curso", "id_curso"]),
+		data=load_duplicated(versao),
 		hide_index=True,
+		width="content",
 		column_config=column_config,
 		row_height=25,
 	)
 
-	st.button("**Novo Curso**", on_click=add, type="primary", icon=":material/add_circle:")
-elif st.session_state["abas"] == 2:
+	st.slider("**Nomes parecidos (similaridade mínima):**", min_value=0.5, max_value=0.95, value=0.8, step=0.05,
+	          key="limiar", width=400)
+
 	st.dataframe(
-		data=curse_duplicated,
+		data=load_similar(versao, st.session_state["limiar"]),
 		hide_index=True,
 		width="content",
-		column_config=column_config,
+		column_config={
+			"nome_a": st.column_config.TextColumn("Curso", width=240),
+			"cursos_a": st.column_config.NumberColumn("Qtde", width=50),
+			"nome_b": st.column_config.TextColumn("Parecido com", width=240),
+			"cursos_b": st.column_config.NumberColumn("Qtde", width=50),
+			"similaridade": st.column_config.ProgressColumn("Similaridade", format="percent", min_value=0,
+			                                                max_value=1),
+		},
 		row_height=25,
 	)
 elif st.session_state["abas"] == 3:
 	st.text_area("**Script de SQL:**", key="sql", width="stretch")
+	st.button("**Executar**", type="primary", icon=":material/code:",
+	          on_click=lambda: set_query(st.session_state["sql"]))
+
+	if st.session_state.get("consulta"):
+		page: int = st.session_state["pagina"]
 
-	if st.button("**Executar**", type="primary", icon=":material/code:"):
 		try:
-			df: pd.DataFrame = engine.query(st.session_state["sql"], show_spinner="Executando o SQL, aguarde...", ttl=1)
-		except (sqlite3.OperationalError, sa.OperationalError):
-			st.toast("**Erro de sintaxe de SQL:** reveja e corrige o script.", icon=":material/error:")
+			with closing(banco.conectar_leitura(engine, segundos=5)) as conn:
+				inicio: float = time.perf_counter()
+				cursor: sqlite3.Cursor = conn.execute(st.session_state["consulta"])
+				colunas: list[str] = banco.colunas(cursor)
+				linhas: list[tuple] = []
+				tabela = st.empty()
+
+				for bloco in banco.ler_pagina(cursor, page, page_size):
+					linhas += bloco
+					tabela.dataframe(pd.DataFrame(linhas, columns=colunas), width="content", hide_index=True)
+
+				mais: bool = cursor.fetchone() is not None
+				decorrido: float = time.perf_counter() - inicio
+				plano: list[str] = banco.plano(conn, st.session_state["consulta"])
+		except sqlite3.Error as error:
+			if "interrupted" in str(error):
+				st.toast("**Consulta interrompida:** passou de 5 segundos.", icon=":material/timer_off:")
+			else:
+				st.toast(f"**Erro no SQL:** {error}", icon=":material/error:")
 		else:
-			st.dataframe(df, width="content", hide_index=True)
-			st.button("**Voltar**", type="primary", icon=":material/reply:")
+			st.caption(f"Linhas {page * page_size + 1 if linhas else 0} a {page * page_size + len(linhas)} "
+			           f"em {decorrido * 1000:.1f} ms")
+
+			with st.container(horizontal=True):
+				st.button("**Anterior**", icon=":material/chevron_left:", disabled=page == 0,
+				          on_click=lambda: st.session_state.update(pagina=page - 1))
+				st.button("**Próxima**", icon=":material/chevron_right:", disabled=not mais,
+				          on_click=lambda: st.session_state.update(pagina=page + 1))
+				st.button("**Voltar**", type="primary", icon=":material/reply:", on_click=set_query, args=(None,))
+
+			with st.expander("**Plano de execução**"):
+				st.code("\n".join(plano), language=None)
 else:
 	st.markdown("**Escolha uma das opções acima!**")
 
@@ -113,3 +262,5 @@ if "aviso" in st.session_state:
 		st.toast("**Curso salvo com sucesso!**", icon=":material/check_circle:")
 
 	del st.session_state["aviso"]
+
+st.sidebar.caption(banco.esperas(engine))
@@ -0,0 +1,56 @@
+import sqlite3
+import tempfile
+import unittest
+from contextlib import closing
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+from utils import banco
+
+
+class ConectarLeituraTest(unittest.TestCase):
+	def setUp(self) -> None:
+		self.pasta: Path = Path(self.enterContext(tempfile.TemporaryDirectory()))
+		banco_teste: Path = self.pasta / "teste.sqlite3"
+
+		with closing(sqlite3.connect(banco_teste)) as conn:
+			conn.execute("CREATE TABLE cursos (id INTEGER PRIMARY KEY, nome TEXT)")
+			conn.execute("INSERT INTO cursos (nome) VALUES ('Python'), ('SQL')")
+			conn.commit()
+
+		self.conn: sqlite3.Connection = self.enterContext(
+			closing(banco.conectar_leitura(create_engine(f"sqlite:///{banco_teste}"), segundos=5))
+		)
+
+	def test_consulta_permitida(self) -> None:
+		sql: str = """
+			WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 2)
+			SELECT upper(nome) FROM cursos INNER JOIN n ON n.i = cursos.id ORDER BY id
+		"""
+		self.assertEqual(self.conn.execute(sql).fetchall(), [("PYTHON",), ("SQL",)])
+
+	def test_vacuum_into_recusado(self) -> None:
+		copia: Path = self.pasta / "copia.sqlite3"
+
+		with self.assertRaises(sqlite3.DatabaseError):
+			self.conn.execute(f"VACUUM INTO '{copia}'")
+
+		self.assertFalse(copia.exists())
+
+	def test_attach_recusado(self) -> None:
+		outro: Path = self.pasta / "outro.sqlite3"
+
+		with self.assertRaises(sqlite3.DatabaseError):
+			self.conn.execute(f"ATTACH DATABASE '{outro}' AS outro")
+
+		self.assertFalse(outro.exists())
+
+	def test_escrita_recusada(self) -> None:
+		for sql in ["DELETE FROM cursos", "PRAGMA journal_mode = DELETE", "CREATE TABLE x (y)"]:
+			with self.subTest(sql=sql), self.assertRaises(sqlite3.DatabaseError):
+				self.conn.execute(sql)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,153 @@
+import sqlite3
+import time
+from collections import deque
+from collections.abc import Iterator
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from sqlalchemy import Engine, create_engine, event, text
+from sqlalchemy.pool import PoolProxiedConnection, QueuePool
+
+# Aplicados a cada conexão nova do pool: WAL deixa as leituras correrem durante uma escrita, NORMAL só sincroniza o
+# disco nos checkpoints do WAL, e o mmap e o cache (em KiB, por isso negativo) poupam leituras do arquivo.
+PRAGMAS: dict[str, str | int] = dict(journal_mode="WAL", synchronous="NORMAL", mmap_size=256 * 1024 ** 2,
+                                     cache_size=-64 * 1024, busy_timeout=5000)
+
+
+class Pool(QueuePool):
+	# QueuePool que guarda quanto tempo cada pedido de conexão esperou (as últimas 1000, em ms).
+	def __init__(self, *args, **kwargs) -> None:
+		super().__init__(*args, **kwargs)
+		self.esperas: deque[float] = deque(maxlen=1000)
+
+	def connect(self) -> PoolProxiedConnection:
+		inicio: float = time.perf_counter()
+
+		try:
+			return super().connect()
+		finally:
+			self.esperas.append((time.perf_counter() - inicio) * 1000)
+
+
+def configurar(conexao: sqlite3.Connection, _registro) -> None:
+	for pragma, valor in PRAGMAS.items():
+		conexao.execute(f"PRAGMA {pragma} = {valor}")
+
+
+@st.cache_resource(show_spinner=False)
+def conexao(nome: str = "SQLite3", tamanho: int = 5) -> Engine:
+	# Um engine (e um pool de `tamanho` conexões, mais outras tantas de folga) por processo, dividido por todas as
+	# páginas e sessões; a url vem de [connections.<nome>] em secrets.toml, como no st.connection.
+	engine: Engine = create_engine(st.secrets["connections"][nome]["url"], poolclass=Pool, pool_size=tamanho,
+	                               max_overflow=tamanho, pool_timeout=30)
+	event.listen(engine, "connect", configurar)
+	return engine
+
+
+def esperas(engine: Engine) -> str:
+	# Resumo da espera por conexão no pool, para o rodapé das páginas.
+	amostra: np.ndarray = np.fromiter(engine.pool.esperas, dtype=float)
+
+	if not len(amostra):
+		return "Pool: sem conexões ainda"
+
+	return f"Pool: {engine.pool.checkedout()} de {engine.pool.size()} conexões em uso · espera média " \
+		f"{amostra.mean():.2f} ms, p95 {np.percentile(amostra, 95):.2f} ms, máx. {amostra.max():.2f} ms " \
+		f"({len(amostra)} pedidos)"
+
+
+def migrar(engine: Engine, dominio: str, migracoes: list[list[str]]) -> int:
+	# Aplica, em ordem, as migrações do domínio ainda não aplicadas; a versão de cada domínio fica em _migracoes.
+	# Cada migração é uma lista de comandos (gatilhos têm ";" no corpo, então não dá para dividir um script).
+	with engine.begin() as conn:
+		conn.execute(text("CREATE TABLE IF NOT EXISTS _migracoes (dominio TEXT PRIMARY KEY, versao INTEGER NOT NULL)"))
+		versao: int = conn.execute(
+			text("SELECT versao FROM _migracoes WHERE dominio = :dominio"), dict(dominio=dominio)
+		).scalar() or 0
+
+		for comandos in migracoes[versao:]:
+			for comando in comandos:
+				conn.execute(text(comando))
+
+		if versao < len(migracoes):
+			conn.execute(
+				text("""
+					INSERT INTO _migracoes (dominio, versao) VALUES (:dominio, :versao)
+					ON CONFLICT(dominio) DO UPDATE SET versao = excluded.versao
+				"""), dict(dominio=dominio, versao=len(migracoes)),
+			)
+
+	return len(migracoes) - versao
+
+
+@st.cache_resource(show_spinner="⏳Preparando o banco, aguarde...")
+def preparar(url: str, dominio: str, _engine: Engine, _migracoes: list[list[str]]) -> int:
+	# Uma vez por processo para cada banco e domínio: a url identifica o engine, que não entra no hash.
+	return migrar(_engine, dominio, _migracoes)
+
+
+def versionar(tabela: str) -> list[str]:
+	# Comandos de migração que mantêm em _versoes um contador de escritas da tabela. Os gatilhos pegam também as
+	# escritas feitas fora do app, e os caches chaveados pela versão só expiram quando a própria tabela muda.
+	return [
+		"CREATE TABLE IF NOT EXISTS _versoes (tabela TEXT PRIMARY KEY, versao INTEGER NOT NULL)",
+		f"INSERT OR IGNORE INTO _versoes (tabela, versao) VALUES ('{tabela}', 0)",
+		*[
+			f"""
+			CREATE TRIGGER IF NOT EXISTS {tabela}_versao_{evento.lower()} AFTER {evento} ON {tabela} BEGIN
+				UPDATE _versoes SET versao = versao + 1 WHERE tabela = '{tabela}';
+			END
+			""" for evento in ["INSERT", "UPDATE", "DELETE"]
+		],
+	]
+
+
+def versao(engine: Engine, tabela: str) -> int:
+	with engine.connect() as conn:
+		return conn.execute(text("SELECT versao FROM _versoes WHERE tabela = :tabela"), dict(tabela=tabela)).scalar_one()
+
+
+def ler(engine: Engine, sql: str, params: dict | None = None) -> pd.DataFrame:
+	# Leitura direta, sem o cache interno do SQLConnection.query: quem chama guarda o resultado com st.cache_data
+	# chaveado pela versão da tabela.
+	with engine.connect() as conn:
+		return pd.read_sql(text(sql), conn, params=params)
+
+
+def plano(conn: sqlite3.Connection, sql: str, params: dict | None = None) -> list[str]:
+	return [linha[-1] for linha in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params or {})]
+
+
+# Únicas ações que o SQL manual pode fazer: mode=ro não impede VACUUM INTO nem ATTACH, que criam arquivos.
+LEITURA: frozenset[int] = frozenset({sqlite3.SQLITE_READ, sqlite3.SQLITE_SELECT, sqlite3.SQLITE_FUNCTION,
+                                     sqlite3.SQLITE_RECURSIVE})
+
+
+def conectar_leitura(engine: Engine, segundos: float) -> sqlite3.Connection:
+	# Conexão à parte, aberta só para leitura (mode=ro) e que só autoriza as ações de LEITURA, que interrompe qualquer
+	# comando que passe de `segundos`.
+	conn: sqlite3.Connection = sqlite3.connect(f"{Path(engine.url.database).resolve().as_uri()}?mode=ro", uri=True)
+	conn.set_authorizer(lambda acao, *_: sqlite3.SQLITE_OK if acao in LEITURA else sqlite3.SQLITE_DENY)
+	limite: float = time.perf_counter() + segundos
+	conn.set_progress_handler(lambda: time.perf_counter() > limite, 10_000)
+	return conn
+
+
+def colunas(cursor: sqlite3.Cursor) -> list[str]:
+	# Nomes das colunas do resultado, numerando os repetidos (o st.dataframe não aceita nomes duplicados).
+	nomes: list[str] = [coluna[0] for coluna in cursor.description or []]
+	return [f"{nome} ({nomes[:i].count(nome) + 1})" if nomes.count(nome) > 1 else nome for i, nome in enumerate(nomes)]
+
+
+def ler_pagina(cursor: sqlite3.Cursor, pagina: int, tamanho: int, bloco: int = 100) -> Iterator[list[tuple]]:
+	# Avança o cursor até a página pedida sem guardar as linhas e entrega a página em blocos, para a tela ir
+	# mostrando o resultado enquanto lê.
+	deque(islice(cursor, pagina * tamanho), maxlen=0)
+	restante: int = tamanho
+
+	while restante and (linhas := cursor.fetchmany(min(bloco, restante))):
+		restante -= len(linhas)
+		yield linhas
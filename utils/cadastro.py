@@ -0,0 +1,176 @@
+import fcntl
+import json
+import os
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+
+CSV: Path = Path("data/cadastro.csv")
+DIARIO: Path = Path("data/cadastro.log")
+
+# Acima deste tamanho o diário é aplicado ao CSV (reescrito uma vez) e recomeça vazio.
+COMPACTAR_APOS: int = 64 * 1024
+
+# O CSV é o retrato (snapshot) e o diário, ao lado, guarda em JSON lines cada inclusão/alteração/exclusão feita depois
+# dele, pelo id da linha. O id é fixo: fica numa coluna do CSV (num CSV antigo, sem ela, vale a posição até a primeira
+# compactação gravá-la) e nunca é reaproveitado, porque o próximo id livre vai no cabeçalho do diário. A 1ª linha do
+# diário grava também mtime e tamanho do CSV, e um diário de outro retrato é descartado.
+# Cada sessão guarda em df.attrs o retrato que carregou e até onde já leu do diário; como o diário só cresce, basta
+# comparar tamanhos para saber se outra sessão escreveu, e só as linhas novas são lidas.
+
+
+@contextmanager
+def travar(csv: Path, exclusiva: bool) -> Iterator[None]:
+	# Trava consultiva (flock) entre sessões e processos: leitores compartilham, quem escreve fica sozinho. Fica num
+	# arquivo à parte porque o CSV é trocado por rename na compactação, e a trava ficaria presa ao arquivo antigo.
+	with csv.with_suffix(".lock").open("a") as arquivo:
+		fcntl.flock(arquivo, fcntl.LOCK_EX if exclusiva else fcntl.LOCK_SH)
+
+		try:
+			yield
+		finally:
+			fcntl.flock(arquivo, fcntl.LOCK_UN)
+
+
+def retrato(csv: Path = CSV) -> str:
+	estado = csv.stat()
+	return f"{estado.st_mtime_ns}:{estado.st_size}"
+
+
+def tamanho(diario: Path = DIARIO) -> int:
+	return diario.stat().st_size if diario.exists() else 0
+
+
+def estado(csv: Path = CSV, diario: Path = DIARIO) -> tuple[str, int]:
+	# Muda sempre que alguém escreve: o CSV só é trocado inteiro (novo mtime) e o diário só recebe linhas no fim.
+	return retrato(csv), tamanho(diario)
+
+
+def valido(diario: Path = DIARIO, csv: Path = CSV) -> bool:
+	with diario.open(encoding="utf-8") as arquivo:
+		return json.loads(arquivo.readline() or "{}").get("retrato") == retrato(csv)
+
+
+def registros(diario: Path = DIARIO, csv: Path = CSV, desde: int = 0) -> tuple[list[dict], int]:
+	# Linhas do diário a partir do byte `desde` e a posição do fim, para a próxima leitura continuar dali.
+	if not diario.exists() or not valido(diario, csv):
+		return [], tamanho(diario)
+
+	with diario.open("rb") as arquivo:
+		arquivo.seek(desde)
+		return [json.loads(linha) for linha in arquivo if linha.strip()], arquivo.tell()
+
+
+def aplicar(df: pd.DataFrame, registro: dict) -> None:
+	if "retrato" in registro:
+		df.attrs["proximo"] = max(df.attrs["proximo"], registro.get("proximo", 0))
+	elif registro["op"] == "delete":
+		df.drop(index=registro["id"], inplace=True, errors="ignore")
+	else:
+		df.loc[registro["id"]] = [registro["nome"], date.fromisoformat(str(registro["nascimento"])), registro["sexo"]]
+		df.attrs["proximo"] = max(df.attrs["proximo"], registro["id"] + 1)
+
+
+def ler(csv: Path, diario: Path) -> pd.DataFrame:
+	df: pd.DataFrame = pd.read_csv(csv, engine="pyarrow")
+	df["nascimento"] = pd.to_datetime(df["nascimento"]).dt.date
+	df = df.set_index("id") if "id" in df.columns else df.set_axis(pd.RangeIndex(len(df), name="id"))
+	df.attrs["retrato"] = retrato(csv)
+	df.attrs["posicao"] = 0
+	df.attrs["proximo"] = int(df.index.max()) + 1 if len(df) else 0
+	return alcancar(df, csv, diario)
+
+
+def alcancar(df: pd.DataFrame, csv: Path, diario: Path) -> pd.DataFrame:
+	# Põe a cópia da sessão em dia com o que as outras gravaram (com a trava já tomada por quem chama). Sem mudança
+	# são só dois stat; diário novo, só as linhas novas; retrato novo (compactação), o CSV é lido de novo.
+	if df.attrs.get("retrato") != retrato(csv) or tamanho(diario) < df.attrs.get("posicao", 0):
+		return ler(csv, diario)
+
+	if tamanho(diario) > df.attrs["posicao"]:
+		novos, df.attrs["posicao"] = registros(diario, csv, df.attrs["posicao"])
+
+		for registro in novos:
+			aplicar(df, registro)
+
+	return df
+
+
+def carregar(csv: Path = CSV, diario: Path = DIARIO) -> pd.DataFrame:
+	with travar(csv, False):
+		return ler(csv, diario)
+
+
+def atualizar(df: pd.DataFrame, csv: Path = CSV, diario: Path = DIARIO) -> pd.DataFrame:
+	with travar(csv, False):
+		return alcancar(df, csv, diario)
+
+
+def registrar(df: pd.DataFrame, registro: dict, csv: Path = CSV, diario: Path = DIARIO) -> pd.DataFrame:
+	# Com a trava exclusiva, a cópia da sessão primeiro recebe o que as outras gravaram (o id novo é o próximo livre de
+	# todas, e ninguém sobrescreve a alteração alheia com uma cópia velha); depois a mudança é aplicada e vai para o
+	# diário como uma linha a mais (custo de E/S constante). Alteração ou exclusão feita sobre um retrato que outra
+	# sessão já trocou (compactação) é recusada: a linha escolhida na tela velha precisa ser conferida de novo.
+	with travar(csv, True):
+		lido: str | None = df.attrs.get("retrato")
+		df = alcancar(df, csv, diario)
+
+		if registro["op"] == "insert":
+			registro["id"] = df.attrs["proximo"]
+		elif lido != df.attrs["retrato"]:
+			raise ValueError("O cadastro foi regravado por outra sessão")
+		elif registro["id"] not in df.index:
+			raise KeyError(registro["id"])
+
+		if diario.exists() and not valido(diario, csv):
+			diario.unlink()
+
+		aplicar(df, registro)
+
+		with diario.open("a", encoding="utf-8") as arquivo:
+			if arquivo.tell() == 0:
+				arquivo.write(json.dumps(dict(retrato=retrato(csv), proximo=df.attrs["proximo"])) + "\n")
+
+			arquivo.write(json.dumps(registro, ensure_ascii=False, default=str) + "\n")
+
+		df.attrs["posicao"] = tamanho(diario)
+
+		if df.attrs["posicao"] > COMPACTAR_APOS:
+			compactar(df, csv, diario)
+
+	return df
+
+
+def compactar(df: pd.DataFrame, csv: Path = CSV, diario: Path = DIARIO) -> None:
+	# Novo retrato (com a coluna id) gravado à parte, levado ao disco e trocado de uma vez (rename atômico); o diário
+	# recomeça só com o cabeçalho, que guarda o próximo id. Se o diário velho sobrar (queda entre os dois passos), ele
+	# não confere com o novo retrato e é ignorado.
+	temporario: Path = csv.with_suffix(".tmp")
+
+	with temporario.open("w", encoding="utf-8", newline="") as arquivo:
+		df.to_csv(arquivo)
+		arquivo.flush()
+		os.fsync(arquivo.fileno())
+
+	temporario.replace(csv)
+	df.attrs["retrato"] = retrato(csv)
+
+	with diario.open("w", encoding="utf-8") as arquivo:
+		arquivo.write(json.dumps(dict(retrato=df.attrs["retrato"], proximo=df.attrs["proximo"])) + "\n")
+
+	df.attrs["posicao"] = tamanho(diario)
+
+
+def incluir(df: pd.DataFrame, nome: str, nascimento: date, sexo: int) -> pd.DataFrame:
+	return registrar(df, dict(op="insert", id=None, nome=nome, nascimento=nascimento, sexo=sexo))
+
+
+def alterar(df: pd.DataFrame, id_linha: int, nome: str, nascimento: date, sexo: int) -> pd.DataFrame:
+	return registrar(df, dict(op="update", id=int(id_linha), nome=nome, nascimento=nascimento, sexo=sexo))
+
+
+def excluir(df: pd.DataFrame, id_linha: int) -> pd.DataFrame:
+	return registrar(df, dict(op="delete", id=int(id_linha)))
@@ -0,0 +1,180 @@
+import re
+from collections import defaultdict
+
+import pandas as pd
+from sqlalchemy import Engine, text
+from unidecode import unidecode
+
+from utils import banco
+
+MIGRACOES: list[list[str]] = [
+	# 1: versão de unibb, que invalida o cache dos cursos a cada escrita
+	banco.versionar("unibb"),
+	# 2: nomes normalizados (por rowid de unibb) e a visão dos cursos repetidos
+	[
+		"""
+		CREATE TABLE IF NOT EXISTS cursos_normalizados (
+			id_linha INTEGER PRIMARY KEY,
+			nm_curso TEXT,
+			nome TEXT NOT NULL
+		)
+		""",
+		"CREATE INDEX IF NOT EXISTS cursos_normalizados_nome ON cursos_normalizados (nome)",
+		"""
+		CREATE VIEW IF NOT EXISTS cursos_duplicados AS
+		SELECT u.*, n.nome AS nome_normalizado
+		FROM unibb u INNER JOIN cursos_normalizados n ON n.id_linha = u.rowid
+		WHERE n.nome IN (SELECT nome FROM cursos_normalizados GROUP BY nome HAVING COUNT(*) > 1)
+		""",
+	],
+	# 3: índice FTS5 (sem acentos) de nome, conhecimento e área, com conteúdo externo em unibb e mantido por gatilhos
+	[
+		"""
+		CREATE VIRTUAL TABLE IF NOT EXISTS unibb_fts USING fts5(
+			nm_curso, cnh_curso, area_cnh_curso, content='unibb', tokenize='unicode61 remove_diacritics 2'
+		)
+		""",
+		"""
+		CREATE TRIGGER IF NOT EXISTS unibb_fts_insert AFTER INSERT ON unibb BEGIN
+			INSERT INTO unibb_fts (rowid, nm_curso, cnh_curso, area_cnh_curso)
+			VALUES (NEW.rowid, NEW.nm_curso, NEW.cnh_curso, NEW.area_cnh_curso);
+		END
+		""",
+		"""
+		CREATE TRIGGER IF NOT EXISTS unibb_fts_delete AFTER DELETE ON unibb BEGIN
+			INSERT INTO unibb_fts (unibb_fts, rowid, nm_curso, cnh_curso, area_cnh_curso)
+			VALUES ('delete', OLD.rowid, OLD.nm_curso, OLD.cnh_curso, OLD.area_cnh_curso);
+		END
+		""",
+		"""
+		CREATE TRIGGER IF NOT EXISTS unibb_fts_update AFTER UPDATE ON unibb BEGIN
+			INSERT INTO unibb_fts (unibb_fts, rowid, nm_curso, cnh_curso, area_cnh_curso)
+			VALUES ('delete', OLD.rowid, OLD.nm_curso, OLD.cnh_curso, OLD.area_cnh_curso);
+			INSERT INTO unibb_fts (rowid, nm_curso, cnh_curso, area_cnh_curso)
+			VALUES (NEW.rowid, NEW.nm_curso, NEW.cnh_curso, NEW.area_cnh_curso);
+		END
+		""",
+		"INSERT INTO unibb_fts (unibb_fts) VALUES ('rebuild')",
+	],
+	# 4: ordem da listagem (paginação por chave) e índice que cobre as horas por estudo/módulo
+	[
+		"CREATE INDEX IF NOT EXISTS unibb_dt_id ON unibb (dt_curso, id_curso)",
+		"CREATE INDEX IF NOT EXISTS unibb_lzc_mod_cg ON unibb (lzc_curso, mod_curso, cg_curso)",
+	],
+]
+
+# A normalização (unidecode) é feita em Python, então não dá para mantê-la por gatilho sem quebrar quem escreve em
+# unibb por fora do app: a cada nova versão de unibb só as linhas novas, alteradas ou removidas são tratadas.
+PENDENTES: str = """
+	SELECT u.rowid AS id_linha, u.nm_curso
+	FROM unibb u LEFT JOIN cursos_normalizados n ON n.id_linha = u.rowid
+	WHERE n.nm_curso IS NOT u.nm_curso
+"""
+
+REMOVER_ORFAOS: str = "DELETE FROM cursos_normalizados WHERE id_linha NOT IN (SELECT rowid FROM unibb)"
+
+NORMALIZAR: str = """
+	INSERT INTO cursos_normalizados (id_linha, nm_curso, nome) VALUES (:id_linha, :nm_curso, :nome)
+	ON CONFLICT(id_linha) DO UPDATE SET nm_curso = excluded.nm_curso, nome = excluded.nome
+"""
+
+CONTAGENS: str = """
+	SELECT
+		(SELECT COUNT(*) FROM unibb) AS cursos,
+		(SELECT COUNT(*) FROM (SELECT nome FROM cursos_normalizados GROUP BY nome HAVING COUNT(*) > 1)) AS repetidos
+"""
+
+DUPLICADOS: str = "SELECT * FROM cursos_duplicados ORDER BY nome_normalizado, dt_curso, id_curso"
+
+NOMES: str = "SELECT nome, COUNT(*) AS cursos FROM cursos_normalizados GROUP BY nome"
+
+# Página dos cursos que casam com a busca, do mais para o menos relevante (bm25), com os termos marcados.
+BUSCA: str = """
+	SELECT
+		u.id_curso,
+		highlight(unibb_fts, 0, '«', '»') AS nm_curso,
+		u.dt_curso,
+		u.cg_curso,
+		u.lzc_curso,
+		u.mod_curso,
+		highlight(unibb_fts, 1, '«', '»') AS cnh_curso,
+		highlight(unibb_fts, 2, '«', '»') AS area_cnh_curso,
+		-bm25(unibb_fts) AS relevancia
+	FROM unibb_fts INNER JOIN unibb u ON u.rowid = unibb_fts.rowid
+	WHERE unibb_fts MATCH :termos
+	ORDER BY rank
+	LIMIT :limite OFFSET :inicio
+"""
+
+# Paginação por chave: cada página começa depois da última (dt_curso, id_curso, rowid) da anterior, sem OFFSET. O
+# rowid desempata os cursos repetidos (mesma data e código), que do contrário sumiriam na virada da página; o índice
+# unibb_dt_id já termina no rowid e continua servindo a ordem.
+PRIMEIRA_PAGINA: str = "SELECT rowid AS id_linha, * FROM unibb ORDER BY dt_curso, id_curso, rowid LIMIT :limite"
+
+PROXIMA_PAGINA: str = """
+	SELECT rowid AS id_linha, * FROM unibb
+	WHERE (dt_curso, id_curso, rowid) > (:dt_curso, :id_curso, :id_linha)
+	ORDER BY dt_curso, id_curso, rowid
+	LIMIT :limite
+"""
+
+HORAS: str = """
+	SELECT lzc_curso, mod_curso, COUNT(*) AS cursos, SUM(cg_curso) AS horas
+	FROM unibb
+	GROUP BY lzc_curso, mod_curso
+	ORDER BY lzc_curso, mod_curso
+"""
+
+TOTAL_BUSCA: str = "SELECT COUNT(*) AS total FROM unibb_fts WHERE unibb_fts MATCH :termos"
+
+
+def normalizar(nome: str | None) -> str:
+	return " ".join(unidecode(nome or "").lower().split())
+
+
+def termos(texto: str) -> str:
+	# Texto livre -> consulta FTS5: cada palavra vira um prefixo entre aspas (sem operadores nem erros de sintaxe).
+	return " ".join(f'"{palavra}"*' for palavra in re.findall(r"\w+", texto))
+
+
+def sincronizar(engine: Engine) -> int:
+	with engine.begin() as conn:
+		conn.execute(text(REMOVER_ORFAOS))
+		pendentes: list[dict] = [dict(linha) for linha in conn.execute(text(PENDENTES)).mappings()]
+
+		if pendentes:
+			conn.execute(text(NORMALIZAR), [linha | dict(nome=normalizar(linha["nm_curso"])) for linha in pendentes])
+
+	return len(pendentes)
+
+
+def semelhantes(nomes: pd.DataFrame, limiar: float) -> pd.DataFrame:
+	# Pares de nomes normalizados distintos com similaridade de Jaccard (entre os conjuntos de palavras) >= limiar.
+	# Só são comparados os pares que dividem alguma palavra e cujos tamanhos permitem chegar ao limiar.
+	palavras: list[frozenset[str]] = [frozenset(nome.split()) for nome in nomes["nome"]]
+	indice: defaultdict[str, list[int]] = defaultdict(list)
+
+	for i, conjunto in enumerate(palavras):
+		for palavra in conjunto:
+			indice[palavra].append(i)
+
+	pares: list[tuple[int, int, float]] = []
+
+	for i, conjunto in enumerate(palavras):
+		candidatos: set[int] = {j for palavra in conjunto for j in indice[palavra] if j > i}
+
+		for j in candidatos:
+			if limiar * len(conjunto) <= len(palavras[j]) <= len(conjunto) / limiar:
+				similaridade: float = len(conjunto & palavras[j]) / len(conjunto | palavras[j])
+
+				if similaridade >= limiar:
+					pares.append((i, j, similaridade))
+
+	i, j, similaridade = zip(*pares) if pares else ((), (), ())
+	return pd.DataFrame({
+		"nome_a": nomes["nome"].to_numpy()[list(i)],
+		"cursos_a": nomes["cursos"].to_numpy()[list(i)],
+		"nome_b": nomes["nome"].to_numpy()[list(j)],
+		"cursos_b": nomes["cursos"].to_numpy()[list(j)],
+		"similaridade": list(similaridade),
+	}).sort_values(["similaridade", "nome_a"], ascending=[False, True], ignore_index=True)
@@ -0,0 +1,307 @@
+import re
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable
+from concurrent.futures import Executor
+from dataclasses import dataclass, field, replace
+from itertools import repeat
+from math import comb
+from multiprocessing.context import ForkServerContext, ForkServerProcess
+from types import ModuleType
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from utils import megasena_store
+
+# Cada sorteio (ou aposta) vira uma máscara de 64 bits: a bola n liga o bit n - 1.
+# Assim, os acertos entre um sorteio e uma aposta são o popcount do AND das duas máscaras.
+
+ROTULOS: np.ndarray = np.array([f"{n:02}" for n in range(61)])
+
+# tamanho da aposta x bolas acertadas -> apostas simples premiadas com 4, 5 e 6 acertos (quadras, quinas e senas)
+PREMIADAS: np.ndarray = np.array([
+	[[comb(k, j) * comb(n - k, 6 - j) if n >= 6 else 0 for j in (4, 5, 6)] for k in range(7)] for n in range(21)
+], dtype=np.int32)
+
+
+def encode(bolas: np.ndarray) -> np.ndarray:
+	bits: np.ndarray = np.left_shift(np.uint64(1), bolas.astype(np.uint64) - np.uint64(1))
+	return np.bitwise_or.reduce(bits, axis=1)
+
+
+def encode_apostas(apostas: Iterable[str]) -> np.ndarray:
+	return np.fromiter(
+		(sum(1 << (bola - 1) for bola in set(map(int, aposta.split()))) for aposta in apostas),
+		dtype=np.uint64,
+	)
+
+
+def ler_apostas(texto: str) -> tuple[list[str], list[int]]:
+	# Uma aposta por linha, com 6 a 20 bolas de 1 a 60 separadas por qualquer caractere não numérico.
+	# Linhas com letras (cabeçalhos) ou vazias são ignoradas; as demais fora da regra voltam como inválidas.
+	apostas: list[str] = []
+	invalidas: list[int] = []
+	
+	for n, linha in enumerate(texto.splitlines(), 1):
+		if re.search(r"[A-Za-z]", linha) or not (bolas := sorted(set(map(int, re.findall(r"\d+", linha))))):
+			continue
+		
+		if 6 <= len(bolas) <= 20 and bolas[0] >= 1 and bolas[-1] <= 60:
+			apostas.append(" ".join(f"{bola:02}" for bola in bolas))
+		else:
+			invalidas.append(n)
+	
+	return apostas, invalidas
+
+
+def decode(mask: int | np.uint64) -> str:
+	mask = int(mask)
+	return " ".join(f"{bola:02}" for bola in range(1, 61) if mask >> (bola - 1) & 1)
+
+
+def rotular(bolas: np.ndarray) -> pd.Series:
+	return pd.Series(ROTULOS[bolas[:, 0]]).str.cat([ROTULOS[bolas[:, i]] for i in range(1, 6)], sep=" ")
+
+
+def one_hot(bolas: np.ndarray) -> np.ndarray:
+	# sorteios x 61 (a coluna 0 fica sempre zerada, para indexar pela própria bola)
+	presenca: np.ndarray = np.zeros((len(bolas), 61), dtype=np.uint8)
+	np.put_along_axis(presenca, bolas.astype(np.intp), 1, axis=1)
+	return presenca
+
+
+def hit_matrix(sorteios: np.ndarray, apostas: np.ndarray) -> np.ndarray:
+	# sorteios x apostas -> quantidade de bolas acertadas (uint8)
+	return np.bitwise_count(sorteios[:, np.newaxis] & apostas[np.newaxis, :])
+
+
+def avaliar(apostas: np.ndarray, sorteios: np.ndarray, rateios: np.ndarray, bloco: int = 1024) -> pd.DataFrame:
+	# Resumo de cada aposta contra todos os sorteios; `rateios` é sorteios x [4, 5, 6] acertos.
+	# Só os pares (aposta, sorteio) com 4 ou mais acertos premiam e eles são raros, então só esses são expandidos
+	# pelas apostas simples premiadas de acordo com o tamanho de cada aposta.
+	tamanhos: np.ndarray = np.bitwise_count(apostas)
+	melhor: np.ndarray = np.empty(len(apostas), dtype=np.uint8)
+	premiadas: np.ndarray = np.zeros((len(apostas), 3), dtype=np.int64)
+	premio: np.ndarray = np.zeros(len(apostas), dtype=np.float64)
+	
+	for inicio in range(0, len(apostas), bloco):
+		acertos: np.ndarray = hit_matrix(apostas[inicio:inicio + bloco], sorteios)
+		melhor[inicio:inicio + bloco] = acertos.max(axis=1, initial=0)
+		
+		i_aposta, i_sorteio = np.nonzero(acertos >= 4)
+		ganhos: np.ndarray = PREMIADAS[tamanhos[inicio + i_aposta], acertos[i_aposta, i_sorteio]]
+		
+		np.add.at(premiadas, inicio + i_aposta, ganhos)
+		np.add.at(premio, inicio + i_aposta, (ganhos * rateios[i_sorteio]).sum(axis=1))
+	
+	return pd.DataFrame({
+		"melhor": melhor,
+		"quadras": premiadas[:, 0],
+		"quinas": premiadas[:, 1],
+		"senas": premiadas[:, 2],
+		"premio": premio,
+	})
+
+
+def avaliar_paralelo(apostas: np.ndarray, sorteios: np.ndarray, rateios: np.ndarray, executor: Executor,
+                     lote: int = 2_000) -> pd.DataFrame:
+	if len(apostas) <= lote:
+		return avaliar(apostas, sorteios, rateios)
+	
+	lotes: list[np.ndarray] = [apostas[inicio:inicio + lote] for inicio in range(0, len(apostas), lote)]
+	return pd.concat(executor.map(avaliar, lotes, repeat(sorteios), repeat(rateios)), ignore_index=True)
+
+
+class Trabalhador(ForkServerProcess):
+	# Processo novo herda o __main__ de quem o cria para refazê-lo; no Streamlit ele é a página (com __file__), que
+	# rodaria de novo em cada processo. Criado com um __main__ vazio, o processo só importa os módulos das funções que
+	# recebe (este). Vale também para o próprio forkserver, que sobe no primeiro start.
+	def start(self) -> None:
+		principal: ModuleType = sys.modules["__main__"]
+		sys.modules["__main__"] = ModuleType("__main__")
+		
+		try:
+			super().start()
+		finally:
+			sys.modules["__main__"] = principal
+
+
+class Processos(ForkServerContext):
+	# forkserver em vez de fork: um fork direto do servidor do Streamlit, cheio de threads, pode travar.
+	Process = Trabalhador
+
+
+def gerar_apostas(rng: np.random.Generator, quantidade: int, pesos: np.ndarray | None = None) -> np.ndarray:
+	# Apostas de 6 bolas distintas; com `pesos` (60 valores), sorteadas sem reposição proporcionalmente a eles
+	# pelo truque de Gumbel-top-k: as 6 maiores chaves log(peso) + Gumbel.
+	chaves: np.ndarray = rng.gumbel(size=(quantidade, 60))
+	
+	if pesos is not None:
+		chaves += np.log(pesos)
+	
+	return encode(np.argpartition(-chaves, 6, axis=1)[:, :6] + 1)
+
+
+def simular(semente: np.random.SeedSequence, quantidade: int, pesos: np.ndarray | None, sorteios: np.ndarray,
+            rateios: np.ndarray, bloco: int = 1024) -> tuple[np.ndarray, float]:
+	# Um lote da simulação: distribuição de acertos de todos os pares (aposta, sorteio) e prêmio total.
+	apostas: np.ndarray = gerar_apostas(np.random.default_rng(semente), quantidade, pesos)
+	distribuicao: np.ndarray = np.zeros(7, dtype=np.int64)
+	premio: float = 0.0
+	
+	for inicio in range(0, len(apostas), bloco):
+		acertos: np.ndarray = hit_matrix(apostas[inicio:inicio + bloco], sorteios)
+		distribuicao += np.bincount(acertos.ravel(), minlength=7)
+		
+		i_aposta, i_sorteio = np.nonzero(acertos >= 4)
+		premio += float(rateios[i_sorteio, acertos[i_aposta, i_sorteio].astype(np.intp) - 4].sum())
+	
+	return distribuicao, premio
+
+
+@dataclass
+class Historico:
+	# Histórico de sorteios de um store (chave) e agregados derivados. Depois de montado não muda mais: um store que
+	# continua este vira uma cópia com só os concursos novos anexados (os atributos são substituídos, nunca alterados
+	# no lugar), então quem já o leu segue com um retrato consistente.
+	apostas: np.ndarray
+	chave: str | None = None
+	tabela: pa.Table = field(default_factory=megasena_store.SCHEMA.empty_table)
+	df: pd.DataFrame = field(default_factory=pd.DataFrame)
+	mascaras: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.uint64))
+	anos: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+	periodos: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+	offsets: np.ndarray = field(default_factory=lambda: np.zeros(1, dtype=np.intp))
+	presenca: np.ndarray = field(default_factory=lambda: np.empty((0, 61), dtype=np.uint8))
+	acumulado: np.ndarray = field(default_factory=lambda: np.zeros((1, 61), dtype=np.int32))
+	pares: np.ndarray = field(default_factory=lambda: np.zeros((61, 61), dtype=np.int32))
+	acertos: np.ndarray | None = None
+	anual: pd.DataFrame = field(default_factory=pd.DataFrame)
+	
+	def __post_init__(self) -> None:
+		if self.acertos is None:
+			self.acertos = np.empty((0, len(self.apostas)), dtype=np.uint8)
+	
+	@property
+	def ultimo(self) -> int:
+		return int(self.df["id_sorteio"].iat[-1]) if len(self.df) else 0
+	
+	@property
+	def virada(self) -> np.ndarray:
+		return self.anual["fim"].to_numpy() if len(self.anual) else np.empty(0, dtype=np.intp)
+	
+	@property
+	def rateios(self) -> np.ndarray:
+		return self.df[["rateios_4x", "rateios_5x", "rateios_6x"]].to_numpy()
+	
+	def mes(self, ano: int, mes: int) -> slice:
+		# Sorteios do mês: o período (ano * 12 + mês - 1) indexa direto a tabela de offsets.
+		k: int = ano * 12 + mes - 1 - (int(self.periodos[0]) if len(self.periodos) else 0)
+		return slice(int(self.offsets[k]), int(self.offsets[k + 1])) if 0 <= k < len(self.offsets) - 1 else slice(0, 0)
+	
+	def frequencias(self, ultimos: int | None = None) -> np.ndarray:
+		# Contagem de cada bola nos `ultimos` sorteios (todos, se None), pela diferença das contagens acumuladas.
+		inicio: int = 0 if ultimos is None else max(len(self.acumulado) - 1 - ultimos, 0)
+		return self.acumulado[-1] - self.acumulado[inicio]
+	
+	def trios(self, bola: int) -> np.ndarray:
+		# Coocorrência dos pares nos sorteios em que `bola` saiu.
+		presenca: np.ndarray = self.presenca[self.presenca[:, bola] == 1].astype(np.int32)
+		return presenca.T @ presenca
+	
+	def continua(self, table: pa.Table) -> bool:
+		# O store é uma extensão deste: o último concurso igual (megasena_store.estende), as linhas até ele idênticas
+		# e algum concurso depois. Qualquer outra diferença (planilha corrigida, outro histórico) pede montar de novo.
+		n: int = self.tabela.num_rows
+		return n > 0 and megasena_store.estende(self.tabela, table.slice(n - 1)) and table.slice(0, n).equals(self.tabela)
+	
+	def seguir(self, chave: str, table: pa.Table) -> "Historico":
+		if self.continua(table):
+			historico: Historico = replace(self, chave=chave)
+			historico.append(table.slice(self.tabela.num_rows))
+		else:
+			historico = Historico(self.apostas, chave)
+			historico.append(table)
+		
+		return historico
+	
+	def append(self, novos: pa.Table) -> None:
+		if not novos.num_rows:
+			return
+		
+		self.tabela = pa.concat_tables([self.tabela, novos]) if self.tabela.num_rows else novos
+		bolas: np.ndarray = megasena_store.bolas(novos)
+		mascaras: np.ndarray = encode(bolas)
+		
+		df: pd.DataFrame = novos.drop_columns(megasena_store.BOLAS).to_pandas()
+		df.insert(2, "dt_texto", df["dt_sorteio"].dt.strftime("%x (%a)"))
+		df.insert(3, "bolas", rotular(bolas))
+		
+		self.df = pd.concat([self.df, df], ignore_index=True) if len(self.df) else df
+		self.mascaras = np.concatenate([self.mascaras, mascaras])
+		
+		presenca: np.ndarray = one_hot(bolas)
+		self.presenca = np.concatenate([self.presenca, presenca])
+		self.acumulado = np.concatenate([self.acumulado, self.acumulado[-1] + presenca.cumsum(axis=0, dtype=np.int32)])
+		self.pares = self.pares + presenca.T.astype(np.int32) @ presenca.astype(np.int32)
+		
+		self.acertos = np.concatenate([self.acertos, hit_matrix(mascaras, self.apostas)])
+		
+		anos: np.ndarray = df["dt_sorteio"].dt.year.to_numpy(dtype=np.int64)
+		self.periodos = np.concatenate([self.periodos, anos * 12 + df["dt_sorteio"].dt.month.to_numpy() - 1])
+		self.offsets = np.searchsorted(self.periodos, np.arange(self.periodos[0], self.periodos[-1] + 2))
+		
+		# Resumo por ano (posição do último sorteio e prêmios pagos) numa só passada sobre os anos já ordenados:
+		# só os anos alcançados pelos concursos novos são recalculados.
+		inicio: int = int(np.searchsorted(self.anos, anos[0]))
+		self.anos = np.concatenate([self.anos, anos])
+		
+		cauda: pd.DataFrame = self.df.iloc[inicio:]
+		comecos: np.ndarray = np.flatnonzero(np.diff(self.anos[inicio:], prepend=-1))
+		fins: np.ndarray = np.append(comecos[1:], len(cauda)) - 1
+		
+		anual: pd.DataFrame = pd.DataFrame({
+			"fim": fins + inicio,
+			"id_sorteio": cauda["id_sorteio"].to_numpy()[fins],
+			"sorteios": fins - comecos + 1,
+			"ganhadores_6x": np.add.reduceat(cauda["winners_6x"].to_numpy(dtype=np.int64), comecos),
+			**{
+				f"pago_{n}x": np.add.reduceat(cauda[f"winners_{n}x"].to_numpy() * cauda[f"rateios_{n}x"].to_numpy(), comecos)
+				for n in (6, 5, 4)
+			},
+			"maior_rateio_6x": np.maximum.reduceat(cauda["rateios_6x"].to_numpy(), comecos),
+		}, index=pd.Index(self.anos[inicio:][comecos], name="ano"))
+		
+		self.anual = pd.concat([self.anual[self.anual.index < anos[0]], anual]) if len(self.anual) else anual
+
+
+@dataclass
+class Historicos:
+	# Um Historico por store (chave), guardando os MANTER usados por último: sessões com planilhas diferentes não
+	# trocam os dados uma da outra. Um store novo que continua um dos guardados é montado a partir dele.
+	apostas: np.ndarray
+	manter: int = megasena_store.MANTER
+	guardados: OrderedDict[str, Historico] = field(default_factory=OrderedDict)
+	lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+	
+	def get(self, chave: str) -> Historico:
+		with self.lock:
+			if chave in self.guardados:
+				self.guardados.move_to_end(chave)
+				return self.guardados[chave]
+			
+			table: pa.Table = megasena_store.load(chave)
+			base: Historico = next(
+				(historico for historico in reversed(self.guardados.values()) if historico.continua(table)),
+				Historico(self.apostas),
+			)
+			
+			self.guardados[chave] = base.seguir(chave, table)
+			
+			while len(self.guardados) > self.manter:
+				self.guardados.popitem(last=False)
+			
+			return self.guardados[chave]
@@ -0,0 +1,75 @@
+from io import BytesIO
+
+import polars as pl
+import pyarrow as pa
+
+from utils import megasena_store
+
+# Caminho alternativo em Polars: a conversão da planilha e as análises da página viram planos lazy,
+# otimizados e executados em paralelo pelo Polars. O caminho em pandas/NumPy continua sendo o padrão.
+
+BITS: dict[int, int] = {bola: 1 << (bola - 1) for bola in range(1, 61)}
+
+
+def read_xlsx(data: bytes) -> pa.Table:
+	lf: pl.LazyFrame = pl.read_excel(BytesIO(data), engine="openpyxl",
+	                                 columns=[*megasena_store.COLUNAS, *megasena_store.BOLAS]) \
+		.lazy().rename(megasena_store.COLUNAS)
+	
+	data_sorteio: pl.Expr = pl.col("dt_sorteio")
+	
+	if lf.collect_schema()["dt_sorteio"] == pl.String:
+		data_sorteio = data_sorteio.str.to_datetime("%d/%m/%Y", time_unit="ns")
+	
+	return lf.select(
+		pl.col("id_sorteio").cast(pl.UInt16),
+		data_sorteio.cast(pl.Datetime("ns")),
+		*[pl.col(bola).cast(pl.UInt8) for bola in megasena_store.BOLAS],
+		*[
+			pl.col(coluna).cast(pl.UInt32) if coluna.startswith("winners")
+			else pl.col(coluna).cast(pl.String).str.replace_all(r"\D", "").cast(pl.Float64) / 100
+			for n in (6, 5, 4) for coluna in (f"winners_{n}x", f"rateios_{n}x")
+		],
+	).sort("id_sorteio", "dt_sorteio").collect().to_arrow()
+
+
+def scan(chave: str) -> pl.LazyFrame:
+	return pl.scan_ipc(megasena_store.store_path(chave)).with_columns(
+		bolas=pl.concat_str([pl.col(bola).cast(pl.String).str.zfill(2) for bola in megasena_store.BOLAS], separator=" "),
+		mask=pl.sum_horizontal(
+			pl.col(bola).replace_strict(BITS, return_dtype=pl.UInt64) for bola in megasena_store.BOLAS
+		),
+	)
+
+
+def virada(lf: pl.LazyFrame, ano_atual: int) -> pl.LazyFrame:
+	# Último sorteio de cada ano (exceto o corrente)
+	return lf.with_columns(ano=pl.col("dt_sorteio").dt.year()) \
+		.filter(pl.col("ano") != ano_atual, pl.col("dt_sorteio") == pl.col("dt_sorteio").max().over("ano")) \
+		.drop("ano", "mask", *megasena_store.BOLAS) \
+		.sort("id_sorteio")
+
+
+def acertos(lf: pl.LazyFrame, apostas: list[int], minimo: int = 4) -> pl.LazyFrame:
+	# Tabela longa (sorteio, aposta) com pelo menos `minimo` acertos e a máscara das bolas acertadas
+	return lf.select(
+		"id_sorteio", "dt_sorteio", "mask",
+		*[(pl.col("mask") & pl.lit(aposta, pl.UInt64)).bitwise_count_ones().alias(str(i))
+		  for i, aposta in enumerate(apostas, 1)],
+	).unpivot(index=["id_sorteio", "dt_sorteio", "mask"], variable_name="aposta", value_name="acertos") \
+		.filter(pl.col("acertos") >= minimo) \
+		.with_columns(
+			pl.col("aposta").cast(pl.Int64),
+			comum=pl.col("mask") & pl.col("aposta").replace_strict(
+				{str(i): aposta for i, aposta in enumerate(apostas, 1)}, return_dtype=pl.UInt64
+			),
+		) \
+		.drop("mask") \
+		.sort("id_sorteio", "aposta")
+
+
+def analisar(chave: str, apostas: list[int], ano_atual: int) -> tuple[pl.DataFrame, pl.DataFrame]:
+	# Os dois planos partem do mesmo scan; collect_all os executa juntos, reaproveitando a parte comum.
+	lf: pl.LazyFrame = scan(chave)
+	df_virada, df_acertos = pl.collect_all([virada(lf, ano_atual), acertos(lf, apostas)])
+	return df_virada, df_acertos
@@ -0,0 +1,198 @@
+import hashlib
+import re
+import time
+from array import array
+from collections.abc import Callable
+from datetime import date
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+import openpyxl
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+CACHE_DIR: Path = Path(__file__).parent.parent / "data" / "cache"
+ATUAL: Path = CACHE_DIR / "megasena-atual"
+
+# Históricos guardados: além dos MANTER usados mais recentemente, os parados há PODAR_APOS segundos são apagados.
+MANTER: int = 4
+PODAR_APOS: float = 24 * 60 * 60
+
+BOLAS: list[str] = [f"Bola{i}" for i in range(1, 7)]
+
+COLUNAS: dict[str, str] = {
+	"Concurso": "id_sorteio",
+	"Data do Sorteio": "dt_sorteio",
+	"Ganhadores 6 acertos": "winners_6x",
+	"Rateio 6 acertos": "rateios_6x",
+	"Ganhadores 5 acertos": "winners_5x",
+	"Rateio 5 acertos": "rateios_5x",
+	"Ganhadores 4 acertos": "winners_4x",
+	"Rateio 4 acertos": "rateios_4x",
+}
+
+SCHEMA: pa.Schema = pa.schema([
+	("id_sorteio", pa.uint16()),
+	("dt_sorteio", pa.timestamp("ns")),
+	*[(bola, pa.uint8()) for bola in BOLAS],
+	*[
+		(coluna, pa.uint32() if coluna.startswith("winners") else pa.float64())
+		for n in (6, 5, 4) for coluna in (f"winners_{n}x", f"rateios_{n}x")
+	],
+])
+
+EPOCA: int = date(1970, 1, 1).toordinal()
+
+
+def digest(data: bytes) -> str:
+	return hashlib.sha256(data).hexdigest()
+
+
+def store_path(chave: str) -> Path:
+	return CACHE_DIR / f"megasena-{chave}.arrow"
+
+
+def centavos(valor: object) -> int:
+	# "R$1.234,56" -> 123456
+	return int(re.sub(r"\D", "", str(valor)) or 0)
+
+
+def dias(valor: object) -> int:
+	# "dd/mm/aaaa" (ou date/datetime) -> dias desde 1970-01-01
+	if isinstance(valor, date):
+		return valor.toordinal() - EPOCA
+	
+	dia, mes, ano = str(valor).split("/")
+	return date(int(ano), int(mes), int(dia)).toordinal() - EPOCA
+
+
+def read_xlsx(data: bytes, depois_de: int = 0) -> pa.Table:
+	# Lê a planilha linha a linha em modo read-only, pegando só as colunas usadas (e só os concursos posteriores a
+	# `depois_de`), direto em arrays tipados: nada da planilha inteira fica em memória.
+	colunas: dict[str, array] = {
+		"id_sorteio": array("H"),
+		"dt_sorteio": array("i"),
+		**{bola: array("B") for bola in BOLAS},
+		**{
+			coluna: array("I" if coluna.startswith("winners") else "q")
+			for n in (6, 5, 4) for coluna in (f"winners_{n}x", f"rateios_{n}x")
+		},
+	}
+	conversores: dict[str, Callable[[object], int]] = {"dt_sorteio": dias} | {
+		f"rateios_{n}x": centavos for n in (6, 5, 4)
+	}
+	
+	wb: openpyxl.Workbook = openpyxl.load_workbook(BytesIO(data), read_only=True, data_only=True)
+	
+	try:
+		rows = wb.active.iter_rows(values_only=True)
+		header: tuple = next(rows)
+		posicoes: list[tuple[int, array, Callable[[object], int]]] = [
+			(header.index(origem), colunas[destino], conversores.get(destino, int))
+			for origem, destino in [*COLUNAS.items(), *zip(BOLAS, BOLAS)]
+		]
+		i_concurso: int = header.index("Concurso")
+		
+		for row in rows:
+			if row[i_concurso] is not None and int(row[i_concurso]) > depois_de:
+				for p, destino, conversor in posicoes:
+					destino.append(conversor(row[p]))
+	finally:
+		wb.close()
+	
+	arrays: dict[str, np.ndarray] = {coluna: np.frombuffer(valores, dtype=valores.typecode)
+	                                 for coluna, valores in colunas.items() if len(valores)}
+	
+	if not arrays:
+		return SCHEMA.empty_table()
+	
+	ordem: np.ndarray = np.lexsort((arrays["dt_sorteio"], arrays["id_sorteio"]))
+	
+	return pa.table({
+		coluna: pa.array(
+			valores[ordem].astype("datetime64[D]").astype("datetime64[ns]") if coluna == "dt_sorteio"
+			else valores[ordem] / 100 if coluna.startswith("rateios")
+			else valores[ordem]
+		)
+		for coluna, valores in arrays.items()
+	}, schema=SCHEMA)
+
+
+def atual() -> str | None:
+	return ATUAL.read_text().strip() if ATUAL.exists() else None
+
+
+def write(table: pa.Table, path: Path) -> None:
+	CACHE_DIR.mkdir(parents=True, exist_ok=True)
+	tmp: Path = path.with_suffix(".tmp")
+	
+	with pa.OSFile(str(tmp), "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+		writer.write_table(table)
+	
+	tmp.replace(path)
+
+
+def estende(historico: pa.Table, novos: pa.Table) -> bool:
+	# A planilha continua o histórico se traz o último concurso dele, igual (data e bolas), e algum concurso depois.
+	if not historico.num_rows or novos.num_rows < 2:
+		return False
+	
+	colunas: list[str] = ["id_sorteio", "dt_sorteio", *BOLAS]
+	return historico.select(colunas).slice(historico.num_rows - 1).equals(novos.select(colunas).slice(0, 1))
+
+
+def podar(*preservar: str, manter: int = MANTER, idade: float = PODAR_APOS) -> None:
+	# Apaga os históricos menos usados: só os que passam dos `manter` mais recentes e estão parados há `idade`
+	# segundos, para não tirar o arquivo de uma sessão que ainda o lê.
+	limite: float = time.time() - idade
+	stores: list[Path] = sorted(CACHE_DIR.glob("megasena-*.arrow"), key=lambda path: path.stat().st_mtime, reverse=True)
+	
+	for path in stores[manter:]:
+		if path not in map(store_path, preservar) and path.stat().st_mtime < limite:
+			path.unlink(missing_ok=True)
+
+
+def ingest(data: bytes, leitor: Callable[[bytes], pa.Table] = read_xlsx) -> str:
+	# A planilha só passa pelo openpyxl uma vez por conteúdo; depois fica em Arrow IPC sem compressão.
+	# Se ela continua o histórico mais recente, só os concursos novos são convertidos e anexados a ele; uma planilha
+	# mais antiga ou de outro histórico é lida inteira. Os históricos anteriores ficam (outras sessões podem estar
+	# lendo) até serem podados por uso.
+	chave: str = digest(data)
+	path: Path = store_path(chave)
+	
+	if path.exists():
+		path.touch()
+		return chave
+	
+	anterior: str | None = atual()
+	table: pa.Table | None = None
+	ultimo: int = 0
+	
+	if anterior is not None and store_path(anterior).exists():
+		historico: pa.Table = load(anterior)
+		ultimo = int(historico["id_sorteio"][-1].as_py()) if historico.num_rows else 0
+		novos: pa.Table = read_xlsx(data, ultimo - 1).cast(historico.schema)
+		
+		if estende(historico, novos):
+			table = pa.concat_tables([historico, novos.slice(1)])
+	
+	if table is None:
+		table = leitor(data)
+	
+	write(table, path)
+	
+	if table.num_rows and int(table["id_sorteio"][-1].as_py()) >= ultimo:
+		ATUAL.write_text(chave)
+	
+	podar(chave, *filter(None, [atual()]))
+	return chave
+
+
+def load(chave: str) -> pa.Table:
+	with pa.memory_map(str(store_path(chave)), "r") as source:
+		return ipc.open_file(source).read_all()
+
+
+def bolas(table: pa.Table) -> np.ndarray:
+	return np.column_stack([table[bola].to_numpy() for bola in BOLAS])
@@ -0,0 +1,223 @@
+import csv
+import sqlite3
+import sys
+from io import BytesIO, StringIO
+from zipfile import BadZipFile
+
+import numpy as np
+import pandas as pd
+from openpyxl.utils.exceptions import InvalidFileException
+from sqlalchemy import Engine, text
+
+from utils import banco
+
+MESES: list[str] = ["jan", "fev", "mar", "abr", "mai", "jun", "jul", "ago", "set", "out", "nov", "dez"]
+
+
+def resumir(periodo: str) -> list[str]:
+	# Recalcula a linha do período em resumo_mensal a partir de mirrors (some se o período ficou sem lançamentos).
+	return [
+		f"DELETE FROM resumo_mensal WHERE período = {periodo};",
+		f"""
+		INSERT INTO resumo_mensal (período, ano, mês, valor, lançamentos)
+		SELECT período, CAST(período / 100 AS INTEGER), período % 100, SUM(valor), COUNT(*)
+		FROM mirrors
+		WHERE período = {periodo}
+		GROUP BY período;
+		""",
+	]
+
+
+MIGRACOES: list[list[str]] = [
+	# 1: totais por período mantidos por gatilhos em mirrors
+	[
+		"""
+		CREATE TABLE IF NOT EXISTS resumo_mensal (
+			período INTEGER PRIMARY KEY,
+			ano INTEGER NOT NULL,
+			mês INTEGER NOT NULL,
+			valor REAL NOT NULL,
+			lançamentos INTEGER NOT NULL
+		)
+		""",
+		"DELETE FROM resumo_mensal",
+		"""
+		INSERT INTO resumo_mensal (período, ano, mês, valor, lançamentos)
+		SELECT período, CAST(período / 100 AS INTEGER), período % 100, SUM(valor), COUNT(*)
+		FROM mirrors
+		GROUP BY período
+		""",
+		f"""
+		CREATE TRIGGER IF NOT EXISTS mirrors_resumo_insert AFTER INSERT ON mirrors BEGIN
+			{"".join(resumir("NEW.período"))}
+		END
+		""",
+		f"""
+		CREATE TRIGGER IF NOT EXISTS mirrors_resumo_delete AFTER DELETE ON mirrors BEGIN
+			{"".join(resumir("OLD.período"))}
+		END
+		""",
+		f"""
+		CREATE TRIGGER IF NOT EXISTS mirrors_resumo_update AFTER UPDATE OF período, valor ON mirrors BEGIN
+			{"".join(resumir("OLD.período"))}
+			{"".join(resumir("NEW.período"))}
+		END
+		""",
+	],
+	# 2: índices para os filtros por período (igualdade e faixa do ano) e para a junção com lances
+	[
+		"CREATE INDEX IF NOT EXISTS mirrors_período ON mirrors (período)",
+		"CREATE INDEX IF NOT EXISTS mirrors_id_lançamento ON mirrors (id_lançamento)",
+	],
+	# 3: versão de mirrors, que invalida os caches do salário a cada escrita
+	banco.versionar("mirrors"),
+]
+
+EXTRATO_MENSAL: str = """
+	SELECT l.lançamento, m.período, m.acerto, m.valor
+	FROM mirrors m INNER JOIN lances l ON l.id_lançamento = m.id_lançamento
+	WHERE m.período = :value
+	ORDER BY m.acerto DESC, m.valor DESC
+"""
+
+# O ano vira a faixa de períodos aaaa01..aaaa12, que usa o índice (CAST(período / 100 ...) obrigaria a varrer mirrors).
+EXTRATO_ANUAL: str = """
+	SELECT l.lançamento, m.período, m.acerto, m.valor
+	FROM mirrors m INNER JOIN lances l ON l.id_lançamento = m.id_lançamento
+	WHERE m.período BETWEEN :inicio AND :fim
+"""
+
+TOTAL_ANUAL: str = "SELECT período, valor FROM resumo_mensal ORDER BY período"
+
+GRAFICO: str = "SELECT mês, valor FROM resumo_mensal WHERE período BETWEEN :inicio AND :fim ORDER BY período"
+
+INSERIR: str = """
+	INSERT INTO mirrors (período, id_lançamento, acerto, valor)
+	VALUES (:período, :id_lançamento, :acerto, :valor)
+"""
+
+COLUNAS_LOTE: list[str] = ["lançamento", "período", "acerto", "valor"]
+
+# Faixa de períodos aceita (aaaamm), no editor e na importação.
+PERIODO_MINIMO: int = 200507
+PERIODO_MAXIMO: int = 203512
+
+# Como o acerto pode vir escrito no lote; vazio é "não".
+ACERTO_SIM: list[str] = ["1", "s", "sim", "x", "true", "verdadeiro"]
+ACERTO_NAO: list[str] = ["", "0", "n", "não", "nao", "false", "falso"]
+
+
+def faixa(ano: int) -> dict[str, int]:
+	return dict(inicio=ano * 100 + 1, fim=ano * 100 + 12)
+
+
+def rotular(periodo: int) -> str:
+	ano, mes = divmod(periodo, 100)
+	return f"{MESES[mes - 1]} / {ano}"
+
+
+def pivotar(linhas: pd.Index, periodos: np.ndarray, valores: np.ndarray) -> pd.DataFrame:
+	# Linhas (rótulos) × meses numa passada: o mês sai de período % 100, e cada valor cai direto na sua célula da
+	# matriz rótulos × 12 (bincount). Ficam só os meses com algum lançamento; média e total saem da mesma matriz.
+	rotulos: pd.Index = linhas.unique().sort_values()
+	codigos: np.ndarray = rotulos.get_indexer(linhas)
+	meses: np.ndarray = np.asarray(periodos, dtype=np.int64) % 100 - 1
+	matriz: np.ndarray = np.bincount(codigos * 12 + meses, weights=valores, minlength=len(rotulos) * 12) \
+		.reshape(len(rotulos), 12)
+	presentes: np.ndarray = np.bincount(meses, minlength=12) > 0
+	matriz = matriz[:, presentes]
+
+	pivo: pd.DataFrame = pd.DataFrame(matriz, index=rotulos, columns=pd.Index(np.array(MESES)[presentes], name="mês"))
+	pivo["média"] = matriz.mean(axis=1) if presentes.any() else np.nan
+	pivo["total"] = matriz.sum(axis=1)
+	return pivo
+
+
+def ler_lote(conteudo: bytes | str, xlsx: bool = False) -> pd.DataFrame:
+	# Planilha ou CSV (colado ou enviado; separador detectado) com as colunas lançamento, período, acerto e valor.
+	# O lançamento pode vir pelo nome ou pelo código; tudo é lido como texto e convertido na validação. Arquivo
+	# ilegível (planilha danificada ou renomeada, CSV sem separador) vira ValueError, como os demais erros do lote.
+	try:
+		if xlsx:
+			lote: pd.DataFrame = pd.read_excel(BytesIO(conteudo), engine="openpyxl", dtype=str)
+		else:
+			texto: str = conteudo.decode("utf-8-sig") if isinstance(conteudo, bytes) else conteudo
+			lote = pd.read_csv(StringIO(texto), sep=None, engine="python", dtype=str, skipinitialspace=True)
+	except (BadZipFile, InvalidFileException, csv.Error) as error:
+		raise ValueError(f"Arquivo ilegível: {error}") from error
+
+	lote.columns = lote.columns.str.strip().str.lower()
+	lote = lote.rename(columns={"id_lançamento": "lançamento"})
+	faltando: list[str] = [coluna for coluna in COLUNAS_LOTE if coluna != "acerto" and coluna not in lote.columns]
+
+	if faltando:
+		raise ValueError(f"Colunas ausentes: {', '.join(faltando)}")
+
+	return lote.reindex(columns=COLUNAS_LOTE).dropna(how="all")
+
+
+def numero(valores: pd.Series) -> pd.Series:
+	# "R$ 1.234,56", "1234,56" ou "1234.56" -> 1234.56 (NaN se não for número)
+	texto: pd.Series = valores.fillna("").str.replace(r"[R$\s]", "", regex=True)
+	texto = texto.where(~texto.str.contains(","), texto.str.replace(".", "").str.replace(",", "."))
+	return pd.to_numeric(texto, errors="coerce")
+
+
+def validar(lote: pd.DataFrame, lances: dict[int, str]) -> tuple[pd.DataFrame, pd.DataFrame]:
+	# Confere o lote contra os lançamentos já carregados, sem ir ao banco; devolve (linhas válidas, linhas rejeitadas
+	# com o motivo).
+	nomes: dict[str, int] = {nome.casefold(): id_lancamento for id_lancamento, nome in lances.items()}
+	texto: pd.Series = lote["lançamento"].fillna("").str.strip()
+	codigos: pd.Series = pd.to_numeric(texto, errors="coerce")
+	ids: pd.Series = codigos.where(codigos.isin(list(lances)), texto.str.casefold().map(nomes))
+
+	periodos: pd.Series = pd.to_numeric(lote["período"], errors="coerce")
+	valores: pd.Series = numero(lote["valor"])
+	acerto: pd.Series = lote["acerto"].fillna("").str.strip().str.casefold()
+	acertos: pd.Series = acerto.isin(ACERTO_SIM)
+
+	motivos: np.ndarray = np.select(
+		[
+			ids.isna(),
+			periodos.isna() | ~periodos.between(PERIODO_MINIMO, PERIODO_MAXIMO) | ~(periodos % 100).between(1, 12),
+			valores.isna(),
+			~acertos & ~acerto.isin(ACERTO_NAO),
+		],
+		["Lançamento desconhecido", "Período inválido", "Valor inválido", "Acerto inválido"],
+		default="",
+	)
+	ok: np.ndarray = motivos == ""
+
+	validas: pd.DataFrame = pd.DataFrame({
+		"período": periodos[ok].astype(int),
+		"id_lançamento": ids[ok].astype(int),
+		"acerto": acertos[ok].astype(int),
+		"valor": valores[ok],
+	})
+	return validas, lote[~ok].assign(motivo=motivos[~ok])
+
+
+def inserir(engine: Engine, linhas: pd.DataFrame) -> int:
+	# Um executemany numa única transação: o lote entra inteiro ou não entra.
+	with engine.begin() as conn:
+		conn.execute(text(INSERIR), linhas[["período", "id_lançamento", "acerto", "valor"]].to_dict("records"))
+
+	return len(linhas)
+
+
+if __name__ == "__main__":
+	# Confere no banco informado que as consultas do extrato usam os índices de mirrors:
+	# python -m utils.salario /caminho/do/banco.sqlite3
+	with sqlite3.connect(sys.argv[1]) as db:
+		consultas: dict[str, tuple[str, dict[str, int]]] = {
+			"Extrato mensal": (EXTRATO_MENSAL, dict(value=202501)),
+			"Extrato anual": (EXTRATO_ANUAL, faixa(2025)),
+		}
+		varreduras: int = 0
+
+		for nome, (sql, params) in consultas.items():
+			detalhes: list[str] = banco.plano(db, sql, params)
+			varreduras += sum(detalhe.startswith("SCAN m") for detalhe in detalhes)
+			print(f"{nome}:", *detalhes, sep="\n\t")
+
+	sys.exit(1 if varreduras else 0)
@@ -0,0 +1,42 @@
+from sqlalchemy import Engine, text
+
+from utils import banco
+
+MIGRACOES: list[list[str]] = [
+	# 1: versão de simples, que invalida o cache da listagem a cada escrita
+	banco.versionar("simples"),
+]
+
+# Paginação por chave (idx é o rowid): cada página começa depois do último idx da anterior, sem OFFSET. A data e o
+# sexo já saem formatados para a tela; a data ISO fica para o formulário de edição.
+COLUNAS: str = """
+	idx, nome, nascimento, strftime('%d/%m/%Y', nascimento) AS data,
+	CASE sexo WHEN 0 THEN 'Feminino' ELSE 'Masculino' END AS rotulo, sexo
+"""
+
+PRIMEIRA_PAGINA: str = f"SELECT {COLUNAS} FROM simples ORDER BY idx LIMIT :limite"
+
+PROXIMA_PAGINA: str = f"SELECT {COLUNAS} FROM simples WHERE idx > :idx ORDER BY idx LIMIT :limite"
+
+TOTAL: str = "SELECT COUNT(*) AS total FROM simples"
+
+# As escritas devolvem a linha afetada (RETURNING) para a cópia da sessão ser corrigida só nela.
+SALVAR: str = """
+	INSERT INTO simples (idx, nome, nascimento, sexo)
+	VALUES (:idx, :nome, :nascimento, :sexo)
+	ON CONFLICT(idx) DO UPDATE SET
+		nome = excluded.nome,
+		nascimento = excluded.nascimento,
+		sexo = excluded.sexo
+	RETURNING idx, nome, nascimento, sexo
+"""
+
+EXCLUIR: str = "DELETE FROM simples WHERE idx = :idx RETURNING idx"
+
+
+def gravar(engine: Engine, sql: str, params: dict) -> tuple[dict | None, int]:
+	# A linha devolvida (None se nada mudou) e a versão de simples lida na mesma transação, já com esta escrita.
+	with engine.begin() as conn:
+		linha = conn.execute(text(sql), params).mappings().first()
+		return dict(linha) if linha else None, \
+			conn.execute(text("SELECT versao FROM _versoes WHERE tabela = 'simples'")).scalar_one()